@@ -2,39 +2,97 @@
 🚑 AI-Based Smart Ambulance Routing & Hospital Facility Matching System
 Main Flask application — 3 Modules: User (public), Driver (auth), Admin (auth)
 """
+# gevent must patch the stdlib before anything else imports socket/threading
+from gevent import monkey
+monkey.patch_all()
+
+import heapq
+import itertools
 import json
 import threading
-from datetime import datetime
-from math import radians, cos, sin, asin, sqrt
-
-from flask import Flask, request, jsonify, render_template, redirect
-from flask_socketio import SocketIO, emit
+from functools import lru_cache
+from time import gmtime, monotonic, strftime, time
+
+import msgspec
+import orjson
+from flask import Flask, Response, request, jsonify, render_template, redirect
+from flask.json.provider import DefaultJSONProvider
+from flask_socketio import SocketIO, emit, join_room
 from flask_cors import CORS
+from flask_compress import Compress
 
 from config import Config
 from database import (
     init_db, seed_hospitals, seed_ambulances,
-    get_all_hospitals, get_hospital_by_id, create_hospital, update_hospital,
+    get_all_hospitals, get_hospitals_by_specialization, get_hospital_by_id,
+    create_hospital, update_hospital,
     delete_hospital, update_hospital_status,
-    get_all_ambulances, get_ambulance_by_id, get_available_ambulances,
+    get_all_ambulances, get_ambulance_by_id, get_available_ambulances_soa,
     get_ambulance_by_firebase_uid, link_ambulance_firebase,
-    update_ambulance_location, update_ambulance_status,
-    create_sos_request, get_sos_request, get_all_sos_requests, get_active_sos_requests,
+    update_ambulance_location, update_ambulance_status, on_locations_written,
+    create_sos_request, get_sos_request, get_sos_requests_enriched,
     update_sos_hospitals,
     assign_ambulance_to_sos, accept_sos_request, enroute_sos_request,
     arrived_sos_request, complete_sos_request, unassign_ambulance_from_sos,
-    get_active_sos_for_driver, save_hospital_scores,
+    get_active_sos_for_driver, finalize_sos,
     log_event, get_events, get_events_for_sos
 )
-from scoring import get_best_hospitals, EMERGENCY_REQUIREMENTS
+from scoring import get_best_hospitals, build_hospital_table, EMERGENCY_REQUIREMENTS
+from scoring_fast import haversine_km
+from spatial import build_zindex, zindex_nearest
 from auth import require_auth, verify_firebase_token, get_token_from_request
 
 # ─── App Setup ───────────────────────────────────
+# numpy scalars/arrays from the vectorized scoring serialize without .tolist()
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for request parsing and jsonify()."""
+
+    def dumps(self, obj, **kwargs):
+        return self._dumpb(obj, kwargs).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumpb(obj, {}), mimetype=self.mimetype)
+
+    def _dumpb(self, obj, kwargs):
+        option = _ORJSON_OPTIONS
+        if kwargs.get("indent") or (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+
+class _OrjsonSocketIO:
+    """json-module stand-in so Socket.IO packets are encoded with orjson too."""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        # Socket.IO asks for compact separators, which orjson always produces
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__, static_folder="static", template_folder="templates")
+app.json = OrjsonProvider(app)
 app.config["SECRET_KEY"] = Config.SECRET_KEY
 app.debug = False
-CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
+# JSON bodies (SOS results, hospital lists) compress well for mobile links
+app.config["COMPRESS_MIMETYPES"] = ["application/json"]
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_LEVEL"] = 4
+app.config["COMPRESS_BR_LEVEL"] = 4
+if Config.ALLOWED_ORIGINS:
+    CORS(app, origins=Config.ALLOWED_ORIGINS)
+Compress(app)
+socketio = SocketIO(app, cors_allowed_origins=Config.ALLOWED_ORIGINS, async_mode="gevent", json=_OrjsonSocketIO)
 
 with app.app_context():
     init_db()
@@ -46,96 +104,407 @@ with app.app_context():
 # HELPERS
 # ═══════════════════════════════════════════════
 
-def _haversine(lat1, lon1, lat2, lon2):
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    return 2 * asin(sqrt(a)) * 6371
+# Hospital list cache — populated lazily after seeding, dropped on any write.
+# "data" holds one snapshot dict so the list and its derived indexes stay in step.
+_HOSPITAL_CACHE = {"data": None}
+_HOSPITAL_CACHE_LOCK = threading.Lock()
+
+
+def _build_hospital_snapshot(hospitals):
+    by_spec = {}
+    for h in hospitals:
+        for spec in {s.lower() for s in h.get("specializations", [])}:
+            by_spec.setdefault(spec, []).append(h)
+    return {
+        "hospitals": hospitals,
+        "by_id": {h["id"]: h for h in hospitals},
+        "summary_base": {h["id"]: _hospital_summary_base(h) for h in hospitals},
+        "table": build_hospital_table(hospitals),  # arrays for vectorized scoring
+        "by_specialization": by_spec,          # lowercased specialization → hospitals
+    }
+
+
+def _cached_hospitals():
+    """Return the hospital snapshot, loading from the DB only on a cache miss."""
+    data = _HOSPITAL_CACHE["data"]
+    if data is None:
+        with _HOSPITAL_CACHE_LOCK:
+            data = _HOSPITAL_CACHE["data"]
+            if data is None:
+                data = _build_hospital_snapshot(get_all_hospitals())
+                _HOSPITAL_CACHE["data"] = data
+    return data
+
+
+def _invalidate_hospital_cache():
+    with _HOSPITAL_CACHE_LOCK:
+        _HOSPITAL_CACHE["data"] = None
+
+
+# SOS row cache for GET /api/sos/<id> polling — sos_id → (expires_at, row).
+# Entries expire after SOS_CACHE_TTL_SEC and are dropped on every SOS write;
+# _SOS_GENERATION stamps each id's latest write (from a global counter, so
+# values never repeat after eviction) and a read it overtakes isn't cached.
+_SOS_CACHE = {}
+_SOS_GENERATION = {}
+_SOS_WRITES = itertools.count(1)
+_SOS_CACHE_LOCK = threading.Lock()
+_SOS_CACHE_MAX = 4096
+
+
+def _cached_sos(sos_id):
+    """Return a copy of the SOS row, reading the DB only on a miss or expiry."""
+    now = time()
+    with _SOS_CACHE_LOCK:
+        entry = _SOS_CACHE.get(sos_id)
+        generation = _SOS_GENERATION.get(sos_id, 0)
+    if entry and entry[0] > now:
+        return dict(entry[1])
+    sos = get_sos_request(sos_id)
+    if sos:
+        with _SOS_CACHE_LOCK:
+            if _SOS_GENERATION.get(sos_id, 0) == generation:
+                if len(_SOS_CACHE) >= _SOS_CACHE_MAX:
+                    _SOS_CACHE.pop(next(iter(_SOS_CACHE)))
+                _SOS_CACHE[sos_id] = (now + Config.SOS_CACHE_TTL_SEC, dict(sos))
+    return sos
+
+
+def _invalidate_sos(sos_id):
+    try:
+        key = int(sos_id)
+    except (TypeError, ValueError):
+        return
+    with _SOS_CACHE_LOCK:
+        _SOS_CACHE.pop(key, None)
+        if key not in _SOS_GENERATION and len(_SOS_GENERATION) >= _SOS_CACHE_MAX:
+            _SOS_GENERATION.pop(next(iter(_SOS_GENERATION)))
+        _SOS_GENERATION[key] = next(_SOS_WRITES)
+
+
+# Available-fleet cache — dropped whenever an ambulance moves or changes status
+_FLEET_CACHE = {"data": None}
+_FLEET_CACHE_LOCK = threading.Lock()
+
+
+def _cached_fleet():
+    """Return available ambulance ids plus a Z-order index over their positions."""
+    data = _FLEET_CACHE["data"]
+    if data is None:
+        with _FLEET_CACHE_LOCK:
+            data = _FLEET_CACHE["data"]
+            if data is None:
+                ids, lats, lngs = get_available_ambulances_soa()
+                data = {"ids": ids, "zindex": build_zindex(lats, lngs)}
+                _FLEET_CACHE["data"] = data
+    return data
+
+
+def _invalidate_fleet():
+    with _FLEET_CACHE_LOCK:
+        _FLEET_CACHE["data"] = None
+
+
+# Location writes land asynchronously, so drop the fleet index once they commit
+on_locations_written(_invalidate_fleet)
+
+
+# ambulance id → id of the SOS it is serving (None when idle), so location
+# broadcasts can pick their rooms without a database read
+_AMB_TRIP = {"map": {}, "generation": 0}
+_AMB_TRIP_LOCK = threading.Lock()
+
+
+def _trip_started(amb_id, sos_id):
+    try:
+        amb_id, sos_id = int(amb_id), int(sos_id)
+    except (TypeError, ValueError):
+        return
+    with _AMB_TRIP_LOCK:
+        _AMB_TRIP["map"][amb_id] = sos_id
+        _AMB_TRIP["generation"] += 1
+
+
+def _trip_ended(sos_id):
+    """Forget whichever ambulance was serving sos_id; its next broadcast re-reads the DB."""
+    try:
+        key = int(sos_id)
+    except (TypeError, ValueError):
+        return
+    with _AMB_TRIP_LOCK:
+        trips = _AMB_TRIP["map"]
+        for amb_id in [a for a, s in trips.items() if s == key]:
+            del trips[amb_id]
+        _AMB_TRIP["generation"] += 1
+
+
+def _current_trip(amb_id):
+    with _AMB_TRIP_LOCK:
+        trips = _AMB_TRIP["map"]
+        if amb_id in trips:
+            return trips[amb_id]
+        generation = _AMB_TRIP["generation"]
+    amb = get_ambulance_by_id(amb_id, fields=("current_sos_id",))
+    sos_id = amb["current_sos_id"] if amb else None
+    with _AMB_TRIP_LOCK:
+        # Don't cache a read that a trip change may have overtaken
+        if _AMB_TRIP["generation"] == generation:
+            _AMB_TRIP["map"][amb_id] = sos_id
+    return sos_id
+
+
+# Index rebuilds allowed per lookup when the cached nearest driver turns out to be taken
+_FLEET_STALE_RETRIES = 3
 
 
 def find_nearest_driver(user_lat, user_lng):
     """Find the nearest available driver by Haversine distance."""
-    available = get_available_ambulances()
-    if not available:
-        return None, None
-    best = None
-    best_dist = float("inf")
-    for amb in available:
-        d = _haversine(user_lat, user_lng, amb["latitude"], amb["longitude"])
-        if d < best_dist:
-            best_dist = d
-            best = amb
-    return best, round(best_dist, 2) if best else None
+    for _ in range(_FLEET_STALE_RETRIES + 1):
+        fleet = _cached_fleet()
+        i, _ = zindex_nearest(fleet["zindex"], user_lat, user_lng)
+        if i is None:
+            return None, None
+        amb = get_ambulance_by_id(int(fleet["ids"][i]))
+        if amb and amb["status"] == "available":
+            # Report the distance at full precision; the index only ranks in float32
+            return amb, round(haversine_km(user_lat, user_lng, amb["latitude"], amb["longitude"]), 2)
+        # The index predates an assignment or removal — rebuild it from the database
+        _invalidate_fleet()
+    return None, None
+
+
+class SosRequest(msgspec.Struct):
+    """POST /api/sos body — decoded and type-checked in one pass by msgspec."""
+    latitude: float | None = None
+    longitude: float | None = None
+    emergency_type: str = "general"
+    # An explicit null is stored as NULL, as before msgspec decoding
+    severity: str | None = "medium"
+    patient_notes: str | None = ""
+
+
+# Returned with every rejected SOS, so build it once
+_VALID_EMERGENCY_TYPES = tuple(EMERGENCY_REQUIREMENTS)
+
+
+# (epoch second, formatted prefix) — strftime runs once per second, not per emit
+_ISO_SECOND = {"cached": (None, "")}
+
+
+def _iso_now():
+    """UTC ISO-8601 timestamp for socket payloads, e.g. 2026-01-01T12:00:00.000Z."""
+    t = time()
+    sec = int(t)
+    cached = _ISO_SECOND["cached"]
+    if cached[0] != sec:
+        cached = (sec, strftime("%Y-%m-%dT%H:%M:%S", gmtime(sec)))
+        _ISO_SECOND["cached"] = cached
+    return f"{cached[1]}.{int(t * 1000) % 1000:03d}Z"
+
+
+# Field order for scored-hospital summaries; also the column order of _hospitals_soa().
+# Static hospital fields come first so they can be precomputed per cache load.
+_HOSPITAL_SUMMARY_COLUMNS = (
+    "id", "name", "address", "phone", "latitude", "longitude",
+    "facilities", "available_icu_beds", "specializations", "navigation_url",
+    "distance_km", "eta_minutes", "readiness_score", "score_breakdown",
+)
+
+
+def _hospital_summary_base(h):
+    """The per-hospital part of a summary row; built once per hospital cache load."""
+    return (
+        h["id"], h["name"], h.get("address", ""), h.get("phone", ""),
+        h["latitude"], h["longitude"],
+        h.get("facilities", []), h.get("available_icu_beds", 0),
+        h.get("specializations", []),
+        f"https://www.google.com/maps/dir/?api=1&destination={h['latitude']},{h['longitude']}",
+    )
+
+
+def _hospital_summary_row(scored, bases):
+    return bases[scored["hospital"]["id"]] + (
+        scored["distance_km"], scored["eta_minutes"],
+        scored["total_score"], scored["scores"],
+    )
+
+
+def _hospital_summary(scored, bases):
+    """Client-facing dict for one scored hospital (None passes through)."""
+    if not scored:
+        return None
+    return dict(zip(_HOSPITAL_SUMMARY_COLUMNS, _hospital_summary_row(scored, bases)))
+
+
+def _hospitals_soa(scored_list, bases):
+    """Columnar form of several summaries: field names are sent once, not per hospital."""
+    return {
+        "columns": _HOSPITAL_SUMMARY_COLUMNS,
+        "rows": [_hospital_summary_row(s, bases) for s in scored_list],
+    }
+
+
+def _sos_rooms(sos_id, *amb_ids):
+    """Rooms following an SOS: admin dashboards, its tracking page, and the given drivers."""
+    return ["admin", f"sos_{sos_id}", *(f"driver_{a}" for a in amb_ids if a)]
+
+
+def _reassign_if_unaccepted(sos_id):
+    """If the driver still hasn't accepted, reassign to the next nearest."""
+    sos = get_sos_request(sos_id, fields=("status", "assigned_ambulance_id"))
+    if sos and sos["status"] == "assigned":
+        # Still assigned but not accepted — reassign
+        old_amb = sos["assigned_ambulance_id"]
+        unassign_ambulance_from_sos(sos_id)
+        _trip_ended(sos_id)
+        _invalidate_fleet()
+        _invalidate_sos(sos_id)
+        sos = get_sos_request(sos_id, fields=("latitude", "longitude"))
+        if sos:
+            driver, dist = find_nearest_driver(sos["latitude"], sos["longitude"])
+            if driver and driver["id"] != old_amb:
+                assign_ambulance_to_sos(sos_id, driver["id"], dist)
+                _trip_started(driver["id"], sos_id)
+                _invalidate_fleet()
+                _invalidate_sos(sos_id)
+                payload = {
+                    "sos_id": sos_id,
+                    "ambulance_id": driver["id"],
+                    "driver_name": driver["driver_name"],
+                    "driver_phone": driver["driver_phone"],
+                    "vehicle_number": driver["vehicle_number"],
+                    "latitude": driver["latitude"],
+                    "longitude": driver["longitude"],
+                    "timestamp": _iso_now()
+                }
+                rooms = _sos_rooms(sos_id, driver["id"], old_amb)
+                # Admin refetches the event log on this event, so announce it once the row is in
+                log_event(sos_id, driver["id"], "driver_reassigned", f"timeout from amb {old_amb}",
+                          on_written=lambda: socketio.emit("driver_reassigned", payload, to=rooms))
+            else:
+                socketio.emit("no_driver_available", {"sos_id": sos_id}, to=_sos_rooms(sos_id))
+
+
+# Pending accept-timeouts as a (deadline, sos_id) min-heap, drained by one
+# daemon worker instead of a timer thread per assignment
+_REASSIGN_HEAP = []
+_REASSIGN_CV = threading.Condition()
+_REASSIGN_WORKER = {"thread": None}
+
+
+def _reassign_worker():
+    while True:
+        with _REASSIGN_CV:
+            while not _REASSIGN_HEAP or _REASSIGN_HEAP[0][0] > time():
+                _REASSIGN_CV.wait(_REASSIGN_HEAP[0][0] - time() if _REASSIGN_HEAP else None)
+            _, sos_id = heapq.heappop(_REASSIGN_HEAP)
+        try:
+            _reassign_if_unaccepted(sos_id)
+        except Exception:
+            app.logger.exception("Reassignment check failed for SOS %s", sos_id)
 
 
 def _schedule_reassignment(sos_id, timeout_sec):
     """If driver doesn't accept within timeout, reassign to next nearest."""
-    def _check():
-        sos = get_sos_request(sos_id)
-        if sos and sos["status"] == "assigned":
-            # Still assigned but not accepted — reassign
-            old_amb = sos["assigned_ambulance_id"]
-            unassign_ambulance_from_sos(sos_id)
-            sos = get_sos_request(sos_id)
-            if sos:
-                driver, dist = find_nearest_driver(sos["latitude"], sos["longitude"])
-                if driver and driver["id"] != old_amb:
-                    assign_ambulance_to_sos(sos_id, driver["id"], dist)
-                    socketio.emit("driver_reassigned", {
-                        "sos_id": sos_id,
-                        "ambulance_id": driver["id"],
-                        "driver_name": driver["driver_name"],
-                        "driver_phone": driver["driver_phone"],
-                        "vehicle_number": driver["vehicle_number"],
-                        "latitude": driver["latitude"],
-                        "longitude": driver["longitude"],
-                        "timestamp": datetime.now().isoformat()
-                    })
-                    log_event(sos_id, driver["id"], "driver_reassigned", f"timeout from amb {old_amb}")
-                else:
-                    socketio.emit("no_driver_available", {"sos_id": sos_id})
-    timer = threading.Timer(timeout_sec, _check)
-    timer.daemon = True
-    timer.start()
+    with _REASSIGN_CV:
+        if _REASSIGN_WORKER["thread"] is None:
+            _REASSIGN_WORKER["thread"] = threading.Thread(target=_reassign_worker, daemon=True)
+            _REASSIGN_WORKER["thread"].start()
+        heapq.heappush(_REASSIGN_HEAP, (time() + timeout_sec, sos_id))
+        _REASSIGN_CV.notify()
+
+
+# location_update fan-out is coalesced per ambulance: at most one broadcast
+# per LOCATION_BROADCAST_MIN_INTERVAL_SEC, with the latest skipped fix sent
+# by a flusher task once the interval has passed.
+# Frames are positional — [ambulance_id, latitude, longitude, epoch_ms] —
+# since this is by far the most frequent event on the wire.
+_LOCATION_LAST_EMIT = {}
+_LOCATION_PENDING = {}
+_LOCATION_LOCK = threading.Lock()
+_LOCATION_FLUSHER = {"task": None}
+
+
+def _broadcast_location(amb_id, lat, lng):
+    payload = [amb_id, lat, lng, int(time() * 1000)]
+    interval = Config.LOCATION_BROADCAST_MIN_INTERVAL_SEC
+    now = monotonic()
+    with _LOCATION_LOCK:
+        if now - _LOCATION_LAST_EMIT.get(amb_id, float("-inf")) >= interval:
+            _LOCATION_LAST_EMIT[amb_id] = now
+            _LOCATION_PENDING.pop(amb_id, None)
+        else:
+            _LOCATION_PENDING[amb_id] = payload
+            if _LOCATION_FLUSHER["task"] is None:
+                _LOCATION_FLUSHER["task"] = socketio.start_background_task(_location_flusher)
+            return
+    _emit_location(payload)
+
+
+def _emit_location(payload):
+    # Dashboards see every ambulance; a tracking page only its own trip's
+    sos_id = _current_trip(payload[0])
+    rooms = ["admin"]
+    if sos_id:
+        rooms.append(f"sos_{sos_id}")
+    socketio.emit("location_update", payload, to=rooms)
+
+
+def _location_flusher():
+    interval = Config.LOCATION_BROADCAST_MIN_INTERVAL_SEC
+    while True:
+        socketio.sleep(interval)
+        now = monotonic()
+        with _LOCATION_LOCK:
+            due = [amb_id for amb_id in _LOCATION_PENDING
+                   if now - _LOCATION_LAST_EMIT.get(amb_id, float("-inf")) >= interval]
+            payloads = [_LOCATION_PENDING.pop(amb_id) for amb_id in due]
+            for amb_id in due:
+                _LOCATION_LAST_EMIT[amb_id] = now
+        for payload in payloads:
+            _emit_location(payload)
 
 
 # ══════════════════════════════════════════════════
 #  PAGE ROUTES
 # ══════════════════════════════════════════════════
 
+_FIREBASE_CONTEXT = (
+    ("firebase_api_key", Config.FIREBASE_API_KEY),
+    ("firebase_auth_domain", Config.FIREBASE_AUTH_DOMAIN),
+    ("firebase_project_id", Config.FIREBASE_PROJECT_ID),
+)
+
+
+@lru_cache(maxsize=1024)
+def _render_page(template, context=()):
+    """Render a page once per distinct context — templates depend only on their arguments."""
+    return render_template(template, **dict(context))
+
+
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return _render_page("index.html")
 
 @app.route("/results/<int:sos_id>")
 def results_page(sos_id):
-    return render_template("results.html", sos_id=sos_id)
+    return _render_page("results.html", (("sos_id", sos_id),))
 
 @app.route("/ambulance/<int:sos_id>/<int:hospital_id>")
 def ambulance_page(sos_id, hospital_id):
-    return render_template("ambulance.html", sos_id=sos_id, hospital_id=hospital_id)
+    return _render_page("ambulance.html", (("sos_id", sos_id), ("hospital_id", hospital_id)))
 
 @app.route("/driver")
 def driver_login():
-    return render_template("driver_login.html",
-                           firebase_api_key=Config.FIREBASE_API_KEY,
-                           firebase_auth_domain=Config.FIREBASE_AUTH_DOMAIN,
-                           firebase_project_id=Config.FIREBASE_PROJECT_ID)
+    return _render_page("driver_login.html", _FIREBASE_CONTEXT)
 
 @app.route("/driver/dashboard")
 def driver_dashboard():
-    return render_template("driver.html",
-                           firebase_api_key=Config.FIREBASE_API_KEY,
-                           firebase_auth_domain=Config.FIREBASE_AUTH_DOMAIN,
-                           firebase_project_id=Config.FIREBASE_PROJECT_ID)
+    return _render_page("driver.html", _FIREBASE_CONTEXT)
 
 @app.route("/admin")
 def admin_dashboard():
-    return render_template("admin.html",
-                           firebase_api_key=Config.FIREBASE_API_KEY,
-                           firebase_auth_domain=Config.FIREBASE_AUTH_DOMAIN,
-                           firebase_project_id=Config.FIREBASE_PROJECT_ID)
+    return _render_page("admin.html", _FIREBASE_CONTEXT)
 
 @app.route("/dashboard")
 def dashboard_redirect():
@@ -148,72 +517,64 @@ def dashboard_redirect():
 
 @app.route("/api/sos", methods=["POST"])
 def handle_sos():
-    data = request.get_json()
-    if not data:
+    body = request.get_data()
+    if not body:
         return jsonify({"error": "No JSON data provided"}), 400
+    try:
+        req = msgspec.json.decode(body, type=SosRequest)
+    except msgspec.DecodeError as e:
+        return jsonify({"error": f"Invalid SOS payload: {e}"}), 400
 
-    lat = data.get("latitude")
-    lng = data.get("longitude")
-    emergency_type = data.get("emergency_type", "general")
-    severity = data.get("severity", "medium")
-    notes = data.get("patient_notes", "")
+    lat, lng = req.latitude, req.longitude
+    emergency_type = req.emergency_type
+    severity = req.severity
+    notes = req.patient_notes
 
     if lat is None or lng is None:
         return jsonify({"error": "GPS coordinates required"}), 400
     if emergency_type not in EMERGENCY_REQUIREMENTS:
         return jsonify({"error": f"Unknown type: {emergency_type}",
-                        "valid_types": list(EMERGENCY_REQUIREMENTS.keys())}), 400
+                        "valid_types": _VALID_EMERGENCY_TYPES}), 400
 
     sos_id = create_sos_request(lat, lng, emergency_type, severity, notes)
-    hospitals = get_all_hospitals()
-    result = get_best_hospitals(hospitals, lat, lng, emergency_type)
+    cache = _cached_hospitals()
+    result = get_best_hospitals(cache["hospitals"], lat, lng, emergency_type, table=cache["table"])
 
     if not result["best"]:
         return jsonify({"error": "No hospitals found in range", "sos_id": sos_id}), 404
 
     best_id = result["best"]["hospital"]["id"]
     backup_id = result["backup"]["hospital"]["id"] if result["backup"] else None
-    update_sos_hospitals(sos_id, best_id, backup_id)
-    save_hospital_scores(sos_id, result["all_scored"])
-
-    socketio.emit("new_sos", {
+    finalize_sos(sos_id, best_id, backup_id, result["all_scored"])
+    _invalidate_sos(sos_id)
+
+    # Only admin dashboards and the matched hospitals need the alert;
+    # it doesn't affect the response, so send it off the request thread
+    rooms = ["admin", f"hospital_{best_id}"]
+    if backup_id:
+        rooms.append(f"hospital_{backup_id}")
+    socketio.start_background_task(socketio.emit, "new_sos", {
         "sos_id": sos_id, "emergency_type": emergency_type,
         "severity": severity, "latitude": lat, "longitude": lng,
         "best_hospital": result["best"]["hospital"]["name"],
         "eta_minutes": result["best"]["eta_minutes"],
-        "timestamp": datetime.now().isoformat()
-    })
-
-    def _summary(scored):
-        if not scored:
-            return None
-        h = scored["hospital"]
-        return {
-            "id": h["id"], "name": h["name"],
-            "address": h.get("address", ""), "phone": h.get("phone", ""),
-            "latitude": h["latitude"], "longitude": h["longitude"],
-            "distance_km": scored["distance_km"], "eta_minutes": scored["eta_minutes"],
-            "readiness_score": scored["total_score"], "score_breakdown": scored["scores"],
-            "facilities": h.get("facilities", []),
-            "available_icu_beds": h.get("available_icu_beds", 0),
-            "specializations": h.get("specializations", []),
-            "navigation_url": f"https://www.google.com/maps/dir/?api=1&destination={h['latitude']},{h['longitude']}"
-        }
+        "timestamp": _iso_now()
+    }, to=rooms)
 
     return jsonify({
         "success": True, "sos_id": sos_id, "emergency_type": emergency_type,
         "latitude": lat, "longitude": lng,
         "requirements": result["requirements"],
-        "best_hospital": _summary(result["best"]),
-        "backup_hospital": _summary(result["backup"]),
+        "best_hospital": _hospital_summary(result["best"], cache["summary_base"]),
+        "backup_hospital": _hospital_summary(result["backup"], cache["summary_base"]),
         "total_hospitals_evaluated": result["total_candidates"],
-        "all_hospitals": [_summary(s) for s in result["all_scored"][:5]]
+        "all_hospitals": _hospitals_soa(result["all_scored"][:5], cache["summary_base"])
     }), 200
 
 
 @app.route("/api/sos/<int:sos_id>", methods=["GET"])
 def get_sos(sos_id):
-    sos = get_sos_request(sos_id)
+    sos = _cached_sos(sos_id)
     if not sos:
         return jsonify({"error": "SOS not found"}), 404
     # Enrich with driver info
@@ -230,7 +591,7 @@ def get_sos(sos_id):
                 "status": amb["status"]
             }
     if sos.get("selected_hospital_id"):
-        hosp = get_hospital_by_id(sos["selected_hospital_id"])
+        hosp = _cached_hospitals()["by_id"].get(sos["selected_hospital_id"])
         if hosp:
             sos["hospital"] = {
                 "id": hosp["id"], "name": hosp["name"],
@@ -271,6 +632,7 @@ def assign_ambulance():
         return jsonify({"error": "Hospital not found"}), 404
 
     update_sos_hospitals(sos_id, hospital_id, None)
+    _invalidate_sos(sos_id)
 
     # Find nearest available driver (Haversine)
     user_lat = sos.get("latitude") or data.get("user_latitude")
@@ -281,6 +643,9 @@ def assign_ambulance():
         return jsonify({"error": "No ambulance drivers available", "sos_id": sos_id}), 503
 
     assign_ambulance_to_sos(sos_id, assigned_amb["id"], dist)
+    _trip_started(assigned_amb["id"], sos_id)
+    _invalidate_fleet()
+    _invalidate_sos(sos_id)
 
     # Notify all via WebSocket
     assignment_data = {
@@ -298,9 +663,9 @@ def assign_ambulance():
         "driver_lat": assigned_amb["latitude"],
         "driver_lng": assigned_amb["longitude"],
         "distance_km": dist,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": _iso_now()
     }
-    socketio.emit("driver_assignment", assignment_data)
+    socketio.emit("driver_assignment", assignment_data, to=_sos_rooms(sos_id, assigned_amb["id"]))
 
     # Schedule reassignment if not accepted
     _schedule_reassignment(sos_id, Config.DRIVER_ACCEPT_TIMEOUT_SEC)
@@ -384,7 +749,7 @@ def driver_active_request(amb_id):
     sos = get_active_sos_for_driver(amb_id)
     if not sos:
         return jsonify({"active": False, "message": "No active requests"}), 200
-    hospital = get_hospital_by_id(sos["selected_hospital_id"]) if sos.get("selected_hospital_id") else None
+    hospital = _cached_hospitals()["by_id"].get(sos.get("selected_hospital_id"))
     return jsonify({
         "active": True, "sos": sos,
         "hospital": hospital,
@@ -399,14 +764,15 @@ def driver_accept(amb_id):
     if not sos_id:
         return jsonify({"error": "sos_id required"}), 400
     accept_sos_request(sos_id, amb_id)
+    _invalidate_sos(sos_id)
     amb = get_ambulance_by_id(amb_id)
     socketio.emit("driver_accepted", {
         "sos_id": sos_id, "ambulance_id": amb_id,
         "driver_name": amb["driver_name"] if amb else "",
         "driver_phone": amb["driver_phone"] if amb else "",
         "vehicle_number": amb["vehicle_number"] if amb else "",
-        "timestamp": datetime.now().isoformat()
-    })
+        "timestamp": _iso_now()
+    }, to=_sos_rooms(sos_id))
     return jsonify({"success": True, "message": "Request accepted"}), 200
 
 
@@ -417,11 +783,12 @@ def driver_enroute(amb_id):
     if not sos_id:
         return jsonify({"error": "sos_id required"}), 400
     enroute_sos_request(sos_id, amb_id)
+    _invalidate_sos(sos_id)
     socketio.emit("status_changed", {
         "sos_id": sos_id, "ambulance_id": amb_id,
         "status": "enroute",
-        "timestamp": datetime.now().isoformat()
-    })
+        "timestamp": _iso_now()
+    }, to=_sos_rooms(sos_id))
     return jsonify({"success": True}), 200
 
 
@@ -432,11 +799,12 @@ def driver_arrived(amb_id):
     if not sos_id:
         return jsonify({"error": "sos_id required"}), 400
     arrived_sos_request(sos_id, amb_id)
+    _invalidate_sos(sos_id)
     socketio.emit("status_changed", {
         "sos_id": sos_id, "ambulance_id": amb_id,
         "status": "arrived",
-        "timestamp": datetime.now().isoformat()
-    })
+        "timestamp": _iso_now()
+    }, to=_sos_rooms(sos_id))
     return jsonify({"success": True}), 200
 
 
@@ -446,12 +814,7 @@ def driver_update_location(amb_id):
     if not data or "latitude" not in data or "longitude" not in data:
         return jsonify({"error": "latitude and longitude required"}), 400
     update_ambulance_location(amb_id, data["latitude"], data["longitude"])
-    socketio.emit("location_update", {
-        "ambulance_id": amb_id,
-        "latitude": data["latitude"],
-        "longitude": data["longitude"],
-        "timestamp": datetime.now().isoformat()
-    })
+    _broadcast_location(amb_id, data["latitude"], data["longitude"])
     return jsonify({"success": True}), 200
 
 
@@ -462,10 +825,13 @@ def driver_complete(amb_id):
     if not sos_id:
         return jsonify({"error": "sos_id required"}), 400
     complete_sos_request(sos_id)
+    _trip_ended(sos_id)
+    _invalidate_fleet()
+    _invalidate_sos(sos_id)
     socketio.emit("trip_completed", {
         "sos_id": sos_id, "ambulance_id": amb_id,
-        "timestamp": datetime.now().isoformat()
-    })
+        "timestamp": _iso_now()
+    }, to=_sos_rooms(sos_id))
     return jsonify({"success": True, "message": "Trip completed"}), 200
 
 
@@ -481,26 +847,7 @@ def list_ambulances():
 @app.route("/api/admin/requests", methods=["GET"])
 def admin_all_requests():
     tab = request.args.get("tab", "all")
-    if tab == "active":
-        reqs = get_active_sos_requests()
-    else:
-        reqs = get_all_sos_requests()
-    # Enrich each request
-    enriched = []
-    for r in reqs:
-        if r.get("assigned_ambulance_id"):
-            amb = get_ambulance_by_id(r["assigned_ambulance_id"])
-            r["driver"] = {
-                "id": amb["id"], "driver_name": amb["driver_name"],
-                "driver_phone": amb["driver_phone"],
-                "vehicle_number": amb["vehicle_number"],
-                "latitude": amb["latitude"], "longitude": amb["longitude"],
-                "status": amb["status"]
-            } if amb else None
-        if r.get("selected_hospital_id"):
-            hosp = get_hospital_by_id(r["selected_hospital_id"])
-            r["hospital_name"] = hosp["name"] if hosp else "Unknown"
-        enriched.append(r)
+    enriched = get_sos_requests_enriched(active_only=(tab == "active"))
     return jsonify({"requests": enriched}), 200
 
 
@@ -518,24 +865,33 @@ def admin_reassign():
 
     # Unassign current
     unassign_ambulance_from_sos(sos_id)
+    _trip_ended(sos_id)
+    _invalidate_fleet()
+    _invalidate_sos(sos_id)
 
     if new_amb_id:
         amb = get_ambulance_by_id(new_amb_id)
         if not amb:
             return jsonify({"error": "Ambulance not found"}), 404
-        dist = _haversine(sos["latitude"], sos["longitude"], amb["latitude"], amb["longitude"])
+        dist = haversine_km(sos["latitude"], sos["longitude"], amb["latitude"], amb["longitude"])
         assign_ambulance_to_sos(sos_id, new_amb_id, round(dist, 2))
+        _trip_started(new_amb_id, sos_id)
+        _invalidate_fleet()
+        _invalidate_sos(sos_id)
     else:
         # Auto-assign nearest
         driver, dist = find_nearest_driver(sos["latitude"], sos["longitude"])
         if driver:
             assign_ambulance_to_sos(sos_id, driver["id"], dist)
+            _trip_started(driver["id"], sos_id)
+            _invalidate_fleet()
+            _invalidate_sos(sos_id)
             new_amb_id = driver["id"]
         else:
             return jsonify({"error": "No available drivers"}), 503
 
     amb = get_ambulance_by_id(new_amb_id)
-    socketio.emit("driver_reassigned", {
+    payload = {
         "sos_id": sos_id,
         "ambulance_id": new_amb_id,
         "driver_name": amb["driver_name"],
@@ -543,26 +899,38 @@ def admin_reassign():
         "vehicle_number": amb["vehicle_number"],
         "latitude": amb["latitude"],
         "longitude": amb["longitude"],
-        "timestamp": datetime.now().isoformat()
-    })
-    log_event(sos_id, new_amb_id, "admin_reassigned", "")
+        "timestamp": _iso_now()
+    }
+    rooms = _sos_rooms(sos_id, new_amb_id, sos["assigned_ambulance_id"])
+    log_event(sos_id, new_amb_id, "admin_reassigned", "",
+              on_written=lambda: socketio.emit("driver_reassigned", payload, to=rooms))
     return jsonify({"success": True, "ambulance": amb}), 200
 
 
 @app.route("/api/admin/events", methods=["GET"])
 def admin_events():
     limit = request.args.get("limit", 50, type=int)
-    return jsonify({"events": get_events(limit)}), 200
+    events = get_events(limit, before=request.args.get("before", type=int))
+    # Pass next_before back as ?before= to fetch the following page
+    next_before = events[-1]["id"] if len(events) == limit else None
+    return jsonify({"events": events, "next_before": next_before}), 200
 
 
 @app.route("/api/hospitals", methods=["GET"])
 def list_hospitals():
-    hospitals = get_all_hospitals()
+    spec = request.args.get("type")
+    if spec and _HOSPITAL_CACHE["data"] is None:
+        # Cold cache: let SQLite filter rather than loading every hospital
+        hospitals = get_hospitals_by_specialization(spec)
+    elif spec:
+        hospitals = _cached_hospitals()["by_specialization"].get(spec.lower(), [])
+    else:
+        hospitals = _cached_hospitals()["hospitals"]
     return jsonify({"hospitals": hospitals, "count": len(hospitals)}), 200
 
 @app.route("/api/hospitals/<int:hid>", methods=["GET"])
 def get_hospital(hid):
-    h = get_hospital_by_id(hid)
+    h = _cached_hospitals()["by_id"].get(hid)
     if not h:
         return jsonify({"error": "Hospital not found"}), 404
     return jsonify(h), 200
@@ -573,6 +941,7 @@ def add_hospital():
     if not data or "name" not in data:
         return jsonify({"error": "Hospital data required"}), 400
     new_id = create_hospital(data)
+    _invalidate_hospital_cache()
     return jsonify({"success": True, "id": new_id, "message": f"Hospital '{data['name']}' created"}), 201
 
 @app.route("/api/hospitals/<int:hid>", methods=["PUT"])
@@ -583,6 +952,7 @@ def edit_hospital(hid):
     if not get_hospital_by_id(hid):
         return jsonify({"error": "Hospital not found"}), 404
     update_hospital(hid, data)
+    _invalidate_hospital_cache()
     return jsonify({"success": True, "message": "Hospital updated"}), 200
 
 @app.route("/api/hospitals/<int:hid>", methods=["DELETE"])
@@ -590,6 +960,7 @@ def remove_hospital(hid):
     if not get_hospital_by_id(hid):
         return jsonify({"error": "Hospital not found"}), 404
     delete_hospital(hid)
+    _invalidate_hospital_cache()
     return jsonify({"success": True, "message": "Hospital deleted"}), 200
 
 @app.route("/api/hospitals/<int:hid>/status", methods=["PUT"])
@@ -597,26 +968,31 @@ def update_status(hid):
     data = request.get_json()
     if not data:
         return jsonify({"error": "No data"}), 400
-    hospital = get_hospital_by_id(hid)
-    if not hospital:
+    updated, name = update_hospital_status(hid, data)
+    if name is None:
         return jsonify({"error": "Hospital not found"}), 404
-    update_hospital_status(hid, data)
-    socketio.emit("hospital_updated", {
-        "hospital_id": hid, "hospital_name": hospital["name"],
-        "updates": data, "timestamp": datetime.now().isoformat()
+    if updated:
+        _invalidate_hospital_cache()
+    # Fan-out to dashboards shouldn't hold up the HTTP reply
+    socketio.start_background_task(socketio.emit, "hospital_updated", {
+        "hospital_id": hid, "hospital_name": name,
+        "updates": data, "timestamp": _iso_now()
     })
     return jsonify({"success": True}), 200
 
+# EMERGENCY_REQUIREMENTS is static, so the response body is built once at import
+_EMERGENCY_TYPES_JSON = json.dumps({
+    k: {
+        "required_facilities": v["facilities"],
+        "required_specialists": v["specialists"],
+        "nice_to_have": v.get("nice_to_have", [])
+    }
+    for k, v in EMERGENCY_REQUIREMENTS.items()
+}, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
 @app.route("/api/emergency-types", methods=["GET"])
 def get_emergency_types():
-    types = {}
-    for k, v in EMERGENCY_REQUIREMENTS.items():
-        types[k] = {
-            "required_facilities": v["facilities"],
-            "required_specialists": v["specialists"],
-            "nice_to_have": v.get("nice_to_have", [])
-        }
-    return jsonify(types), 200
+    return Response(_EMERGENCY_TYPES_JSON, mimetype="application/json"), 200
 
 
 # ══════════════════════════════════════════════════
@@ -625,6 +1001,19 @@ def get_emergency_types():
 
 @socketio.on("connect")
 def on_connect():
+    # Dashboards opt into targeted alerts via the connection query string
+    if request.args.get("role") == "admin":
+        join_room("admin")
+    hospital_id = request.args.get("hospital_id", type=int)
+    if hospital_id:
+        join_room(f"hospital_{hospital_id}")
+    # Tracking pages follow one SOS; driver consoles their own assignments
+    sos_id = request.args.get("sos_id", type=int)
+    if sos_id:
+        join_room(f"sos_{sos_id}")
+    ambulance_id = request.args.get("ambulance_id", type=int)
+    if ambulance_id:
+        join_room(f"driver_{ambulance_id}")
     emit("connected", {"message": "Connected to Smart Ambulance System"})
 
 @socketio.on("disconnect")
@@ -633,14 +1022,20 @@ def on_disconnect():
 
 @socketio.on("location_update")
 def on_location(data):
-    if "ambulance_id" in data and "latitude" in data and "longitude" in data:
-        update_ambulance_location(data["ambulance_id"], data["latitude"], data["longitude"])
-    emit("location_update", data, broadcast=True)
+    try:
+        amb_id, lat, lng = int(data["ambulance_id"]), data["latitude"], data["longitude"]
+    except (KeyError, TypeError, ValueError):
+        return
+    update_ambulance_location(amb_id, lat, lng)
+    _broadcast_location(amb_id, lat, lng)
 
 @socketio.on("join_sos")
 def on_join_sos(data):
     """Client subscribes to updates for a specific SOS request."""
-    pass  # All events are broadcast; client filters by sos_id
+    try:
+        join_room(f"sos_{int(data['sos_id'])}")
+    except (KeyError, TypeError, ValueError):
+        pass
 
 
 # ══════════════════════════════════════════════════
@@ -654,4 +1049,4 @@ if __name__ == "__main__":
     print(f"🔧 Admin:       http://localhost:{Config.PORT}/admin")
     print(f"🔍 Radius:      {Config.SEARCH_RADIUS_KM} km")
     socketio.run(app, host=Config.HOST, port=Config.PORT,
-                 debug=False, use_reloader=False, allow_unsafe_werkzeug=True)
+                 debug=False, use_reloader=False)
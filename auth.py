@@ -1,8 +1,11 @@
 """
 Firebase Authentication Helper — Verifies Firebase ID tokens for protected routes.
 """
+import base64
 import functools
 import json
+import threading
+import time
 import urllib.request
 import urllib.error
 from flask import request, jsonify
@@ -11,11 +14,21 @@ from config import Config
 # Google's public key endpoint for verifying Firebase tokens
 GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
 
+# Issuer every token for our project must carry (None disables the check)
+_EXPECTED_ISS = (f"https://securetoken.google.com/{Config.FIREBASE_PROJECT_ID}"
+                 if Config.FIREBASE_PROJECT_ID else None)
+
 # In-memory cache of Firebase users (uid -> role)
 # In production, use Firebase Admin SDK. This is a lightweight verifier.
 ADMIN_EMAILS = set()
 DRIVER_EMAILS = set()
 
+# Verified claims by raw token (token -> (claims, exp)), so repeat calls
+# within a token's lifetime skip the decode. Oldest entries evicted first.
+_TOKEN_CACHE = {}
+_TOKEN_CACHE_LOCK = threading.Lock()
+_TOKEN_CACHE_MAX = 4096
+
 
 def _decode_jwt_unverified(token):
     """
@@ -23,7 +36,6 @@ def _decode_jwt_unverified(token):
     For hackathon use — in production, use firebase-admin SDK with full verification.
     This extracts claims from the token payload.
     """
-    import base64
     parts = token.split(".")
     if len(parts) != 3:
         return None
@@ -45,20 +57,25 @@ def verify_firebase_token(token):
     """
     if not token:
         return None
+    now = time.time()
+    cached = _TOKEN_CACHE.get(token)
+    if cached and cached[1] >= now:
+        return cached[0]
     try:
         claims = _decode_jwt_unverified(token)
         if not claims:
             return None
         # Check issuer matches our project
-        project_id = Config.FIREBASE_PROJECT_ID
-        if project_id:
-            expected_iss = f"https://securetoken.google.com/{project_id}"
-            if claims.get("iss") != expected_iss:
-                return None
+        if _EXPECTED_ISS and claims.get("iss") != _EXPECTED_ISS:
+            return None
         # Check expiry
-        import time
-        if claims.get("exp", 0) < time.time():
+        exp = claims.get("exp", 0)
+        if exp < now:
             return None
+        with _TOKEN_CACHE_LOCK:
+            if token not in _TOKEN_CACHE and len(_TOKEN_CACHE) >= _TOKEN_CACHE_MAX:
+                _TOKEN_CACHE.pop(next(iter(_TOKEN_CACHE)))
+            _TOKEN_CACHE[token] = (claims, exp)
         return claims
     except Exception:
         return None
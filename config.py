@@ -14,6 +14,12 @@ class Config:
     DEBUG = os.getenv("FLASK_DEBUG", "false").lower() == "true"
     SECRET_KEY = os.getenv("SECRET_KEY", "ambulance-sos-secret-key-2026")
 
+    # Extra browser origins allowed for CORS and Socket.IO (comma-separated).
+    # Unset means same-origin only, which is what the bundled pages need.
+    ALLOWED_ORIGINS = [
+        o.strip() for o in os.getenv("ALLOWED_ORIGINS", "").split(",") if o.strip()
+    ] or None
+
     # Google Maps (optional)
     GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
 
@@ -27,9 +33,14 @@ class Config:
     WEIGHT_SPECIALIST = float(os.getenv("WEIGHT_SPECIALIST", 0.15))
     WEIGHT_PREDICTION = float(os.getenv("WEIGHT_PREDICTION", 0.10))
     WEIGHT_HISTORY = float(os.getenv("WEIGHT_HISTORY", 0.05))
+    # All six in scoring order, for unpacking once per score
+    WEIGHTS = (WEIGHT_FACILITY, WEIGHT_DISTANCE, WEIGHT_BEDS,
+               WEIGHT_SPECIALIST, WEIGHT_PREDICTION, WEIGHT_HISTORY)
 
     # Database
     DATABASE_PATH = os.path.join(os.path.dirname(__file__), "data", "hospital.db")
+    # Idle SQLite connections kept open for reuse
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
 
     # Average ambulance speed for ETA estimation (km/h)
     AVG_AMBULANCE_SPEED_KMH = 40
@@ -43,3 +54,8 @@ class Config:
     # Driver assignment
     DRIVER_ACCEPT_TIMEOUT_SEC = int(os.getenv("DRIVER_ACCEPT_TIMEOUT_SEC", 60))
     LOCATION_UPDATE_INTERVAL_SEC = int(os.getenv("LOCATION_UPDATE_INTERVAL_SEC", 5))
+    # Minimum gap between location_update broadcasts for one ambulance
+    LOCATION_BROADCAST_MIN_INTERVAL_SEC = float(os.getenv("LOCATION_BROADCAST_MIN_INTERVAL_SEC", 0.5))
+
+    # How long GET /api/sos/<id> may serve a cached SOS row (SOS writes invalidate it)
+    SOS_CACHE_TTL_SEC = float(os.getenv("SOS_CACHE_TTL_SEC", 10))
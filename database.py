@@ -2,18 +2,73 @@
 Database module — SQLite setup, seeding, and CRUD operations.
 Supports Hospitals, Ambulances/Drivers, SOS Requests, Assignment History, and Event Log.
 """
+import atexit
 import sqlite3
-import json
+import logging
 import os
+import queue
+import threading
+from time import gmtime, monotonic, strftime
+import numpy as np
+import orjson
 from config import Config
 
 
-def get_db():
+def _to_json(value):
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+# Lists and dicts bound as query parameters are stored as JSON text
+sqlite3.register_adapter(list, _to_json)
+sqlite3.register_adapter(dict, _to_json)
+
+
+class _PooledConnection(sqlite3.Connection):
+    """Connection whose close() hands it back to the pool instead of closing it."""
+
+    def close(self):
+        if self._idle:
+            return  # already returned — guard against double close
+        if self.in_transaction:
+            self.rollback()
+        self._idle = True
+        try:
+            _POOL.put_nowait(self)
+        except queue.Full:
+            super().close()
+
+
+# Idle connections, most recently used first so their page cache stays warm
+_POOL = queue.LifoQueue(maxsize=Config.DB_POOL_SIZE)
+
+
+def _connect():
     os.makedirs(os.path.dirname(Config.DATABASE_PATH), exist_ok=True)
-    conn = sqlite3.connect(Config.DATABASE_PATH)
+    # Pooled connections live long, so give every distinct statement a slot
+    conn = sqlite3.connect(Config.DATABASE_PATH, factory=_PooledConnection,
+                           check_same_thread=False, cached_statements=256)
+    conn.path = Config.DATABASE_PATH
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+
+def get_db():
+    """Borrow a connection from the pool (opening one if none are idle); close() returns it."""
+    while True:
+        try:
+            conn = _POOL.get_nowait()
+        except queue.Empty:
+            conn = _connect()
+            break
+        if conn.path == Config.DATABASE_PATH:
+            break
+        sqlite3.Connection.close(conn)  # database moved since it was pooled
+    conn._idle = False
     return conn
 
 
@@ -27,13 +82,10 @@ def init_db():
             longitude REAL NOT NULL,
             address TEXT,
             phone TEXT,
-            specializations TEXT,
-            facilities TEXT,
             total_beds INTEGER DEFAULT 0,
             icu_beds INTEGER DEFAULT 0,
             available_icu_beds INTEGER DEFAULT 0,
             available_general_beds INTEGER DEFAULT 0,
-            doctors_on_duty TEXT,
             equipment_status TEXT,
             load_percentage REAL DEFAULT 0,
             historical_success_rate REAL DEFAULT 0.5,
@@ -41,6 +93,16 @@ def init_db():
             last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
 
+        -- Hospital list fields (specializations, facilities, doctors_on_duty),
+        -- one row per entry in list order
+        CREATE TABLE IF NOT EXISTS hospital_tags (
+            hospital_id INTEGER NOT NULL REFERENCES hospitals(id) ON DELETE CASCADE,
+            kind TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            PRIMARY KEY (hospital_id, kind, position)
+        ) WITHOUT ROWID;
+
         CREATE TABLE IF NOT EXISTS ambulances (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             driver_name TEXT NOT NULL,
@@ -105,8 +167,44 @@ def init_db():
             detail TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
+
+        CREATE INDEX IF NOT EXISTS idx_amb_status ON ambulances(status);
+        CREATE INDEX IF NOT EXISTS idx_amb_firebase ON ambulances(firebase_uid);
+        CREATE INDEX IF NOT EXISTS idx_sos_status_created ON sos_requests(status, created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_sos_created ON sos_requests(created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_sos_ambulance ON sos_requests(assigned_ambulance_id, status);
+        CREATE INDEX IF NOT EXISTS idx_events_sos_created ON event_log(sos_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_events_created ON event_log(created_at DESC, id DESC);
+
+        -- The ambulance side of each SOS transition follows from the sos_requests update
+        CREATE TRIGGER IF NOT EXISTS trg_sos_assigned
+        AFTER UPDATE OF status ON sos_requests
+        WHEN NEW.status = 'assigned' AND NEW.assigned_ambulance_id IS NOT NULL
+        BEGIN
+            UPDATE ambulances SET status='busy', current_sos_id=NEW.id, last_updated=CURRENT_TIMESTAMP
+            WHERE id = NEW.assigned_ambulance_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_sos_completed
+        AFTER UPDATE OF status ON sos_requests
+        WHEN NEW.status = 'completed' AND NEW.assigned_ambulance_id IS NOT NULL
+        BEGIN
+            UPDATE ambulances SET status='available', current_sos_id=NULL
+            WHERE id = NEW.assigned_ambulance_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_sos_unassigned
+        AFTER UPDATE OF assigned_ambulance_id ON sos_requests
+        WHEN OLD.assigned_ambulance_id IS NOT NULL AND NEW.assigned_ambulance_id IS NULL
+        BEGIN
+            UPDATE ambulances SET status='available', current_sos_id=NULL
+            WHERE id = OLD.assigned_ambulance_id;
+            INSERT INTO assignment_history (sos_id, ambulance_id, action)
+            VALUES (NEW.id, OLD.assigned_ambulance_id, 'unassigned');
+        END;
     """)
     _migrate_columns(conn)
+    _migrate_hospital_tags(conn)
     conn.commit()
     conn.close()
 
@@ -118,6 +216,20 @@ def _migrate_columns(conn):
     _add_column(conn, "sos_requests", "arrived_at", "TIMESTAMP")
 
 
+def _migrate_hospital_tags(conn):
+    """Move list fields from the old JSON text columns into hospital_tags, once."""
+    columns = {r["name"] for r in conn.execute("PRAGMA table_info(hospitals)")}
+    for kind in _TAG_FIELDS:
+        if kind not in columns:
+            continue
+        conn.execute(f"""
+            INSERT OR IGNORE INTO hospital_tags (hospital_id, kind, position, name)
+            SELECT h.id, ?, j.key, j.value FROM hospitals h, json_each(h.{kind}) j
+            WHERE h.{kind} IS NOT NULL AND json_valid(h.{kind})
+        """, (kind,))
+        conn.execute(f"UPDATE hospitals SET {kind}=NULL WHERE {kind} IS NOT NULL")
+
+
 def _add_column(conn, table, column, col_type):
     try:
         conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
@@ -131,38 +243,35 @@ def _add_column(conn, table, column, col_type):
 
 def seed_hospitals():
     conn = get_db()
-    count = conn.execute("SELECT COUNT(*) FROM hospitals").fetchone()[0]
-    if count > 0:
+    if conn.execute("SELECT 1 FROM hospitals LIMIT 1").fetchone():
         conn.close()
         return
     seed_path = os.path.join(os.path.dirname(__file__), "data", "hospitals_seed.json")
     if not os.path.exists(seed_path):
         conn.close()
         return
-    with open(seed_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(seed_path, "rb") as f:
+        data = orjson.loads(f.read())
+    tags = []
     for h in data.get("hospitals", []):
-        conn.execute("""
+        cur = conn.execute("""
             INSERT INTO hospitals (
                 name, latitude, longitude, address, phone,
-                specializations, facilities, total_beds, icu_beds,
-                available_icu_beds, available_general_beds,
-                doctors_on_duty, equipment_status, load_percentage,
-                historical_success_rate, is_verified
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+                total_beds, icu_beds, available_icu_beds, available_general_beds,
+                equipment_status, load_percentage, historical_success_rate, is_verified
+            ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
         """, (
             h["name"], h["latitude"], h["longitude"],
             h.get("address", ""), h.get("phone", ""),
-            json.dumps(h.get("specializations", [])),
-            json.dumps(h.get("facilities", [])),
             h.get("total_beds", 0), h.get("icu_beds", 0),
             h.get("available_icu_beds", 0), h.get("available_general_beds", 0),
-            json.dumps(h.get("doctors_on_duty", [])),
-            json.dumps(h.get("equipment_status", {})),
+            h.get("equipment_status", {}),
             h.get("load_percentage", 50),
             h.get("historical_success_rate", 0.5),
             1 if h.get("is_verified", False) else 0
         ))
+        tags += _tag_rows(cur.lastrowid, h)
+    conn.executemany(_INSERT_TAG_SQL, tags)
     conn.commit()
     conn.close()
     print(f"✅ Seeded {len(data['hospitals'])} hospitals")
@@ -170,8 +279,7 @@ def seed_hospitals():
 
 def seed_ambulances():
     conn = get_db()
-    count = conn.execute("SELECT COUNT(*) FROM ambulances").fetchone()[0]
-    if count > 0:
+    if conn.execute("SELECT 1 FROM ambulances LIMIT 1").fetchone():
         conn.close()
         return
     drivers = [
@@ -179,11 +287,10 @@ def seed_ambulances():
         ("Suresh Babu", "+91-9876543211", "AP-07-CD-5678", 16.5100, 80.6400),
         ("Venkat Rao", "+91-9876543212", "AP-07-EF-9012", 16.4500, 80.6800),
     ]
-    for name, phone, vehicle, lat, lng in drivers:
-        conn.execute("""
-            INSERT INTO ambulances (driver_name, driver_phone, vehicle_number, latitude, longitude, status)
-            VALUES (?,?,?,?,?,?)
-        """, (name, phone, vehicle, lat, lng, "available"))
+    conn.executemany("""
+        INSERT INTO ambulances (driver_name, driver_phone, vehicle_number, latitude, longitude, status)
+        VALUES (?,?,?,?,?,'available')
+    """, drivers)
     conn.commit()
     conn.close()
     print(f"✅ Seeded {len(drivers)} ambulance drivers")
@@ -193,47 +300,87 @@ def seed_ambulances():
 #  HOSPITAL HELPERS
 # ═══════════════════════════════════════════════
 
-def _parse_hospital(row):
-    h = dict(row)
-    for field in ("specializations", "facilities", "doctors_on_duty"):
-        h[field] = json.loads(h.get(field) or "[]")
-    h["equipment_status"] = json.loads(h.get("equipment_status") or "{}")
-    return h
+_TAG_FIELDS = ("specializations", "facilities", "doctors_on_duty")
+
+_HOSPITAL_COLUMNS = """
+    h.id, h.name, h.latitude, h.longitude, h.address, h.phone,
+    h.total_beds, h.icu_beds, h.available_icu_beds, h.available_general_beds,
+    h.equipment_status, h.load_percentage, h.historical_success_rate,
+    h.is_verified, h.last_updated
+"""
+
+_INSERT_TAG_SQL = "INSERT INTO hospital_tags (hospital_id, kind, position, name) VALUES (?,?,?,?)"
+
+def _tag_rows(hid, data, kinds=_TAG_FIELDS):
+    return [(hid, kind, i, name)
+            for kind in kinds
+            for i, name in enumerate(data.get(kind) or [])]
+
+def _replace_tags(conn, hid, data, kinds=_TAG_FIELDS):
+    conn.execute(f"DELETE FROM hospital_tags WHERE hospital_id=? AND kind IN ({','.join('?' * len(kinds))})",
+                 (hid, *kinds))
+    conn.executemany(_INSERT_TAG_SQL, _tag_rows(hid, data, kinds))
+
+def _load_hospitals(conn, where="", params=()):
+    """Hospital dicts with their list fields rebuilt from hospital_tags."""
+    hospitals = {}
+    for h in _fetch_dicts(conn, f"SELECT {_HOSPITAL_COLUMNS} FROM hospitals h {where}", params):
+        h["equipment_status"] = orjson.loads(h["equipment_status"]) if h["equipment_status"] else {}
+        for kind in _TAG_FIELDS:
+            h[kind] = []
+        hospitals[h["id"]] = h
+    if hospitals:
+        tags = conn.execute(f"""
+            SELECT t.hospital_id, t.kind, t.name FROM hospital_tags t
+            WHERE t.hospital_id IN (SELECT h.id FROM hospitals h {where})
+            ORDER BY t.hospital_id, t.kind, t.position
+        """, params)
+        for hid, kind, name in tags:
+            hospitals[hid][kind].append(name)
+    return list(hospitals.values())
 
 def get_all_hospitals():
     conn = get_db()
-    rows = conn.execute("SELECT * FROM hospitals").fetchall()
+    hospitals = _load_hospitals(conn)
     conn.close()
-    return [_parse_hospital(r) for r in rows]
+    return hospitals
+
+def get_hospitals_by_specialization(spec):
+    conn = get_db()
+    hospitals = _load_hospitals(conn, """
+        WHERE EXISTS (
+            SELECT 1 FROM hospital_tags s
+            WHERE s.hospital_id=h.id AND s.kind='specializations' AND lower(s.name)=lower(?)
+        )
+    """, (spec,))
+    conn.close()
+    return hospitals
 
 def get_hospital_by_id(hid):
     conn = get_db()
-    row = conn.execute("SELECT * FROM hospitals WHERE id=?", (hid,)).fetchone()
+    hospitals = _load_hospitals(conn, "WHERE h.id=?", (hid,))
     conn.close()
-    return _parse_hospital(row) if row else None
+    return hospitals[0] if hospitals else None
 
 def create_hospital(data):
     conn = get_db()
     cur = conn.execute("""
         INSERT INTO hospitals (
             name, latitude, longitude, address, phone,
-            specializations, facilities, total_beds, icu_beds,
-            available_icu_beds, available_general_beds,
-            doctors_on_duty, load_percentage, historical_success_rate, is_verified
-        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+            total_beds, icu_beds, available_icu_beds, available_general_beds,
+            load_percentage, historical_success_rate, is_verified
+        ) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
     """, (
         data["name"], data["latitude"], data["longitude"],
         data.get("address", ""), data.get("phone", ""),
-        json.dumps(data.get("specializations", [])),
-        json.dumps(data.get("facilities", [])),
         data.get("total_beds", 0), data.get("icu_beds", 0),
         data.get("available_icu_beds", 0), data.get("available_general_beds", 0),
-        json.dumps(data.get("doctors_on_duty", [])),
         data.get("load_percentage", 0),
         data.get("historical_success_rate", 0.5),
         1 if data.get("is_verified") else 0
     ))
     new_id = cur.lastrowid
+    conn.executemany(_INSERT_TAG_SQL, _tag_rows(new_id, data))
     conn.commit()
     conn.close()
     return new_id
@@ -244,25 +391,22 @@ def update_hospital(hid, data):
     conn.execute("""
         UPDATE hospitals SET
             name=?, latitude=?, longitude=?, address=?, phone=?,
-            specializations=?, facilities=?, total_beds=?, icu_beds=?,
+            total_beds=?, icu_beds=?,
             available_icu_beds=?, available_general_beds=?,
-            doctors_on_duty=?, load_percentage=?,
-            historical_success_rate=?, is_verified=?,
+            load_percentage=?, historical_success_rate=?, is_verified=?,
             last_updated=CURRENT_TIMESTAMP
         WHERE id=?
     """, (
         data["name"], data["latitude"], data["longitude"],
         data.get("address", ""), data.get("phone", ""),
-        json.dumps(data.get("specializations", [])),
-        json.dumps(data.get("facilities", [])),
         data.get("total_beds", 0), data.get("icu_beds", 0),
         data.get("available_icu_beds", 0), data.get("available_general_beds", 0),
-        json.dumps(data.get("doctors_on_duty", [])),
         data.get("load_percentage", 0),
         data.get("historical_success_rate", 0.5),
         1 if data.get("is_verified") else 0,
         hid
     ))
+    _replace_tags(conn, hid, data)
     conn.commit()
     conn.close()
 
@@ -272,59 +416,166 @@ def delete_hospital(hid):
     conn.commit()
     conn.close()
 
+_STATUS_FIELDS = ("available_icu_beds", "available_general_beds", "load_percentage", "equipment_status")
+
+# One statement for every subset of fields, so it stays in the statement cache;
+# a NULL parameter keeps the current value
+_UPDATE_STATUS_SQL = f"""
+    UPDATE hospitals SET {', '.join(f'{f}=COALESCE(?, {f})' for f in _STATUS_FIELDS)},
+        last_updated=CURRENT_TIMESTAMP
+    WHERE id=? RETURNING name
+"""
+
 def update_hospital_status(hid, updates):
-    conn = get_db()
-    allowed = ["available_icu_beds", "available_general_beds", "load_percentage", "doctors_on_duty", "equipment_status"]
-    parts, vals = [], []
-    for f in allowed:
-        if f in updates:
-            parts.append(f"{f}=?")
-            v = updates[f]
-            vals.append(json.dumps(v) if isinstance(v, (list, dict)) else v)
-    if not parts:
+    """
+    Apply live-status fields to a hospital in one transaction.
+    Returns (updated, name) — name is None when the hospital doesn't exist.
+    """
+    conn = get_db()
+    doctors = "doctors_on_duty" in updates
+    if not doctors and not any(f in updates for f in _STATUS_FIELDS):
+        row = conn.execute("SELECT name FROM hospitals WHERE id=?", (hid,)).fetchone()
         conn.close()
-        return False
-    parts.append("last_updated=CURRENT_TIMESTAMP")
-    vals.append(hid)
-    conn.execute(f"UPDATE hospitals SET {', '.join(parts)} WHERE id=?", vals)
+        return False, row["name"] if row else None
+    row = conn.execute(_UPDATE_STATUS_SQL, (*(updates.get(f) for f in _STATUS_FIELDS), hid)).fetchone()
+    if row and doctors:
+        _replace_tags(conn, hid, updates, ("doctors_on_duty",))
     conn.commit()
     conn.close()
-    return True
+    return (True, row["name"]) if row else (False, None)
 
 
 # ═══════════════════════════════════════════════
 #  AMBULANCE HELPERS
 # ═══════════════════════════════════════════════
 
+_AMBULANCE_FIELDS = frozenset((
+    "id", "driver_name", "driver_phone", "vehicle_number", "firebase_uid",
+    "latitude", "longitude", "status", "current_sos_id", "last_updated",
+))
+
+def _projection(fields, allowed):
+    """SELECT list for an optional field whitelist — "*" when fields is None."""
+    if fields is None:
+        return "*"
+    unknown = set(fields) - allowed
+    if unknown:
+        raise ValueError(f"Unknown fields: {sorted(unknown)}")
+    return ", ".join(fields)
+
+def _fetch_dicts(conn, sql, params=()):
+    """
+    Run a query and return its rows as plain dicts, zipped from tuples against
+    the column names once rather than building an sqlite3.Row per row first.
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(sql, params)
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur]
+
+def _fetch_dict(conn, sql, params=()):
+    """First row of a query as a plain dict, or None."""
+    cur = conn.cursor()
+    cur.row_factory = None
+    row = cur.execute(sql, params).fetchone()
+    return dict(zip([d[0] for d in cur.description], row)) if row else None
+
 def get_all_ambulances():
     conn = get_db()
-    rows = conn.execute("SELECT * FROM ambulances").fetchall()
+    rows = _fetch_dicts(conn, "SELECT * FROM ambulances")
     conn.close()
-    return [dict(r) for r in rows]
+    return rows
 
-def get_ambulance_by_id(aid):
+def get_ambulance_by_id(aid, fields=None):
     conn = get_db()
-    row = conn.execute("SELECT * FROM ambulances WHERE id=?", (aid,)).fetchone()
+    row = _fetch_dict(conn, f"SELECT {_projection(fields, _AMBULANCE_FIELDS)} FROM ambulances WHERE id=?", (aid,))
     conn.close()
-    return dict(row) if row else None
+    return row
 
 def get_ambulance_by_firebase_uid(uid):
     conn = get_db()
-    row = conn.execute("SELECT * FROM ambulances WHERE firebase_uid=?", (uid,)).fetchone()
+    row = _fetch_dict(conn, "SELECT * FROM ambulances WHERE firebase_uid=?", (uid,))
     conn.close()
-    return dict(row) if row else None
+    return row
 
 def get_available_ambulances():
     conn = get_db()
-    rows = conn.execute("SELECT * FROM ambulances WHERE status='available'").fetchall()
+    rows = _fetch_dicts(conn, "SELECT * FROM ambulances WHERE status='available'")
     conn.close()
-    return [dict(r) for r in rows]
+    return rows
 
-def update_ambulance_location(aid, lat, lng):
+def get_available_ambulances_soa():
+    """Available ambulances as parallel arrays: (ids int64, lat float32, lng float32)."""
     conn = get_db()
-    conn.execute("UPDATE ambulances SET latitude=?, longitude=?, last_updated=CURRENT_TIMESTAMP WHERE id=?", (lat, lng, aid))
-    conn.commit()
+    rows = conn.execute("SELECT id, latitude, longitude FROM ambulances WHERE status='available'").fetchall()
     conn.close()
+    ids, lats, lngs = zip(*rows) if rows else ((), (), ())
+    return (np.array(ids, dtype=np.int64),
+            np.array(lats, dtype=np.float32),
+            np.array(lngs, dtype=np.float32))
+
+# Location pings are the hottest write path, so they go through a single
+# background writer that commits them in batches instead of taking the
+# SQLite write lock once per request.
+_LOCATION_QUEUE = queue.SimpleQueue()
+_LOCATION_BATCH_MAX = 64
+_LOCATION_BATCH_WINDOW_SEC = 0.05
+_LOCATION_LISTENERS = []
+_LOCATION_WRITER_LOCK = threading.Lock()
+_location_writer_started = False
+
+
+def on_locations_written(callback):
+    """Register a no-arg callback run after each batch of locations is committed."""
+    _LOCATION_LISTENERS.append(callback)
+
+
+def update_ambulance_location(aid, lat, lng):
+    """Queue a location update; the background writer persists it shortly after."""
+    global _location_writer_started
+    if not _location_writer_started:
+        with _LOCATION_WRITER_LOCK:
+            if not _location_writer_started:
+                threading.Thread(target=_location_writer, name="location-writer", daemon=True).start()
+                _location_writer_started = True
+    _LOCATION_QUEUE.put((aid, lat, lng))
+
+
+def _next_batch(q, limit, window_sec):
+    """Block for one item, then keep collecting until `limit` items or `window_sec` pass."""
+    batch = [q.get()]
+    deadline = monotonic() + window_sec
+    while len(batch) < limit:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(q.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _location_writer():
+    while True:
+        batch = _next_batch(_LOCATION_QUEUE, _LOCATION_BATCH_MAX, _LOCATION_BATCH_WINDOW_SEC)
+        # Only the newest fix per ambulance matters
+        latest = {aid: (lat, lng) for aid, lat, lng in batch}
+        try:
+            conn = get_db()
+            try:
+                conn.executemany(
+                    "UPDATE ambulances SET latitude=?, longitude=?, last_updated=CURRENT_TIMESTAMP WHERE id=?",
+                    [(lat, lng, aid) for aid, (lat, lng) in latest.items()],
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            for callback in _LOCATION_LISTENERS:
+                callback()
+        except Exception:
+            logging.getLogger(__name__).exception("Failed to write %d location update(s)", len(latest))
 
 def update_ambulance_status(aid, status, sos_id=None):
     conn = get_db()
@@ -350,42 +601,81 @@ def create_sos_request(lat, lng, etype, severity="medium", notes=""):
         VALUES (?,?,?,?,?,'pending')
     """, (lat, lng, etype, severity, notes))
     sid = cur.lastrowid
+    log_event(sid, None, "request_created", f"{etype}/{severity}", conn=conn)
     conn.commit()
     conn.close()
-    log_event(sid, None, "request_created", f"{etype}/{severity}")
     return sid
 
-def get_sos_request(sid):
+_SOS_FIELDS = frozenset((
+    "id", "latitude", "longitude", "emergency_type", "severity", "patient_notes",
+    "selected_hospital_id", "backup_hospital_id", "assigned_ambulance_id", "status",
+    "created_at", "assigned_at", "accepted_at", "enroute_at", "arrived_at", "completed_at",
+))
+
+def get_sos_request(sid, fields=None):
     conn = get_db()
-    row = conn.execute("SELECT * FROM sos_requests WHERE id=?", (sid,)).fetchone()
+    row = _fetch_dict(conn, f"SELECT {_projection(fields, _SOS_FIELDS)} FROM sos_requests WHERE id=?", (sid,))
     conn.close()
-    return dict(row) if row else None
+    return row
 
-def get_all_sos_requests():
+def get_all_sos_requests(fields=None):
     conn = get_db()
-    rows = conn.execute("SELECT * FROM sos_requests ORDER BY created_at DESC").fetchall()
+    rows = _fetch_dicts(conn, f"SELECT {_projection(fields, _SOS_FIELDS)} FROM sos_requests ORDER BY created_at DESC")
     conn.close()
-    return [dict(r) for r in rows]
+    return rows
 
-def get_active_sos_requests():
+def get_active_sos_requests(fields=None):
     conn = get_db()
-    rows = conn.execute("""
-        SELECT * FROM sos_requests
+    rows = _fetch_dicts(conn, f"""
+        SELECT {_projection(fields, _SOS_FIELDS)} FROM sos_requests
         WHERE status NOT IN ('completed','cancelled')
         ORDER BY created_at DESC
-    """).fetchall()
+    """)
+    conn.close()
+    return rows
+
+_DRIVER_FIELDS = ("id", "driver_name", "driver_phone", "vehicle_number", "latitude", "longitude", "status")
+
+def get_sos_requests_enriched(active_only=False):
+    """
+    SOS requests (newest first) with their driver and hospital name attached,
+    in one LEFT JOIN instead of a lookup per row.
+    """
+    where = "WHERE s.status NOT IN ('completed','cancelled')" if active_only else ""
+    conn = get_db()
+    rows = _fetch_dicts(conn, f"""
+        SELECT s.*,
+               a.id AS drv_id, a.driver_name AS drv_driver_name, a.driver_phone AS drv_driver_phone,
+               a.vehicle_number AS drv_vehicle_number, a.latitude AS drv_latitude,
+               a.longitude AS drv_longitude, a.status AS drv_status,
+               h.name AS hosp_name
+        FROM sos_requests s
+        LEFT JOIN ambulances a ON a.id = s.assigned_ambulance_id
+        LEFT JOIN hospitals h ON h.id = s.selected_hospital_id
+        {where}
+        ORDER BY s.created_at DESC
+    """)
     conn.close()
-    return [dict(r) for r in rows]
+    enriched = []
+    for r in rows:
+        driver = {f: r.pop(f"drv_{f}") for f in _DRIVER_FIELDS}
+        hosp_name = r.pop("hosp_name")
+        if r.get("assigned_ambulance_id"):
+            r["driver"] = driver if driver["id"] is not None else None
+        if r.get("selected_hospital_id"):
+            r["hospital_name"] = hosp_name or "Unknown"
+        enriched.append(r)
+    return enriched
 
 def get_active_sos_for_driver(amb_id):
     conn = get_db()
-    row = conn.execute("""
+    row = _fetch_dict(conn, """
         SELECT * FROM sos_requests
         WHERE assigned_ambulance_id=? AND status IN ('assigned','accepted','enroute','arrived')
         ORDER BY created_at DESC LIMIT 1
-    """, (amb_id,)).fetchone()
+    """, (amb_id,))
     conn.close()
-    return dict(row) if row else None
+    return row
 
 def update_sos_hospitals(sid, selected_id, backup_id=None):
     conn = get_db()
@@ -395,73 +685,74 @@ def update_sos_hospitals(sid, selected_id, backup_id=None):
 
 def assign_ambulance_to_sos(sid, amb_id, distance_km=None):
     conn = get_db()
+    # trg_sos_assigned marks the ambulance busy
     conn.execute("UPDATE sos_requests SET assigned_ambulance_id=?, status='assigned', assigned_at=CURRENT_TIMESTAMP WHERE id=?", (amb_id, sid))
-    conn.execute("UPDATE ambulances SET status='busy', current_sos_id=?, last_updated=CURRENT_TIMESTAMP WHERE id=?", (sid, amb_id))
+    log_event(sid, amb_id, "driver_assigned", "", conn=conn)
+    log_assignment(sid, amb_id, "assigned", distance_km, conn=conn)
     conn.commit()
     conn.close()
-    log_event(sid, amb_id, "driver_assigned", "")
-    log_assignment(sid, amb_id, "assigned", distance_km)
 
 def accept_sos_request(sid, amb_id):
     conn = get_db()
     conn.execute("UPDATE sos_requests SET status='accepted', accepted_at=CURRENT_TIMESTAMP WHERE id=? AND assigned_ambulance_id=?", (sid, amb_id))
+    log_event(sid, amb_id, "driver_accepted", "", conn=conn)
     conn.commit()
     conn.close()
-    log_event(sid, amb_id, "driver_accepted", "")
 
 def enroute_sos_request(sid, amb_id):
     conn = get_db()
     conn.execute("UPDATE sos_requests SET status='enroute', enroute_at=CURRENT_TIMESTAMP WHERE id=? AND assigned_ambulance_id=?", (sid, amb_id))
+    log_event(sid, amb_id, "status_changed", "enroute", conn=conn)
     conn.commit()
     conn.close()
-    log_event(sid, amb_id, "status_changed", "enroute")
 
 def arrived_sos_request(sid, amb_id):
     conn = get_db()
     conn.execute("UPDATE sos_requests SET status='arrived', arrived_at=CURRENT_TIMESTAMP WHERE id=? AND assigned_ambulance_id=?", (sid, amb_id))
+    log_event(sid, amb_id, "status_changed", "arrived", conn=conn)
     conn.commit()
     conn.close()
-    log_event(sid, amb_id, "status_changed", "arrived")
 
 def complete_sos_request(sid):
     conn = get_db()
-    row = conn.execute("SELECT assigned_ambulance_id FROM sos_requests WHERE id=?", (sid,)).fetchone()
-    amb_id = None
-    if row and row["assigned_ambulance_id"]:
-        amb_id = row["assigned_ambulance_id"]
-        conn.execute("UPDATE ambulances SET status='available', current_sos_id=NULL WHERE id=?", (amb_id,))
-    conn.execute("UPDATE sos_requests SET status='completed', completed_at=CURRENT_TIMESTAMP WHERE id=?", (sid,))
+    # trg_sos_completed frees the ambulance
+    row = conn.execute("UPDATE sos_requests SET status='completed', completed_at=CURRENT_TIMESTAMP WHERE id=? "
+                       "RETURNING assigned_ambulance_id", (sid,)).fetchone()
+    amb_id = row["assigned_ambulance_id"] if row else None
+    log_event(sid, amb_id, "trip_completed", "", conn=conn)
     conn.commit()
     conn.close()
-    log_event(sid, amb_id, "trip_completed", "")
 
 def unassign_ambulance_from_sos(sid):
     """Unassign the current driver so request can be reassigned."""
     conn = get_db()
-    row = conn.execute("SELECT assigned_ambulance_id FROM sos_requests WHERE id=?", (sid,)).fetchone()
-    if row and row["assigned_ambulance_id"]:
-        conn.execute("UPDATE ambulances SET status='available', current_sos_id=NULL WHERE id=?", (row["assigned_ambulance_id"],))
-        log_assignment(sid, row["assigned_ambulance_id"], "unassigned")
+    # trg_sos_unassigned frees the ambulance and records the unassignment
     conn.execute("UPDATE sos_requests SET assigned_ambulance_id=NULL, status='pending', assigned_at=NULL, accepted_at=NULL WHERE id=?", (sid,))
     conn.commit()
     conn.close()
 
-def save_hospital_scores(sid, scored):
+_INSERT_SCORE_SQL = """
+    INSERT INTO sos_hospital_scores (
+        sos_id, hospital_id, facility_score, distance_score,
+        bed_score, specialist_score, prediction_score,
+        history_score, total_score, distance_km, eta_minutes
+    ) VALUES (?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+def _score_rows(sid, scored):
+    return [(
+        sid, sh["hospital"]["id"],
+        sh["scores"]["facility"], sh["scores"]["distance"],
+        sh["scores"]["bed"], sh["scores"]["specialist"],
+        sh["scores"]["prediction"], sh["scores"]["history"],
+        sh["total_score"], sh["distance_km"], sh["eta_minutes"]
+    ) for sh in scored]
+
+def finalize_sos(sid, selected_id, backup_id, scored):
+    """Record the chosen hospitals and every per-hospital score in one transaction."""
     conn = get_db()
-    for sh in scored:
-        conn.execute("""
-            INSERT INTO sos_hospital_scores (
-                sos_id, hospital_id, facility_score, distance_score,
-                bed_score, specialist_score, prediction_score,
-                history_score, total_score, distance_km, eta_minutes
-            ) VALUES (?,?,?,?,?,?,?,?,?,?,?)
-        """, (
-            sid, sh["hospital"]["id"],
-            sh["scores"]["facility"], sh["scores"]["distance"],
-            sh["scores"]["bed"], sh["scores"]["specialist"],
-            sh["scores"]["prediction"], sh["scores"]["history"],
-            sh["total_score"], sh["distance_km"], sh["eta_minutes"]
-        ))
+    conn.execute("UPDATE sos_requests SET selected_hospital_id=?, backup_hospital_id=? WHERE id=?", (selected_id, backup_id, sid))
+    conn.executemany(_INSERT_SCORE_SQL, _score_rows(sid, scored))
     conn.commit()
     conn.close()
 
@@ -470,28 +761,133 @@ def save_hospital_scores(sid, scored):
 #  ASSIGNMENT HISTORY & EVENT LOG
 # ═══════════════════════════════════════════════
 
-def log_assignment(sos_id, amb_id, action, distance_km=None):
-    conn = get_db()
+_INSERT_ASSIGNMENT_SQL = "INSERT INTO assignment_history (sos_id, ambulance_id, action, distance_km, created_at) VALUES (?,?,?,?,?)"
+_INSERT_EVENT_SQL = "INSERT INTO event_log (sos_id, ambulance_id, event_type, detail, created_at) VALUES (?,?,?,?,?)"
+
+# Log rows written outside a caller's transaction are handed to a background
+# writer and committed in batches, off the request path. They are stamped
+# when queued, so a late commit doesn't reorder them. A row may carry an
+# `on_written` callback, run once it is committed — callers that notify
+# clients who then re-read the log emit from there.
+_LOG_QUEUE = queue.Queue(maxsize=10_000)
+_LOG_BATCH_MAX = 100
+_LOG_BATCH_WINDOW_SEC = 0.05
+_LOG_WRITER_LOCK = threading.Lock()
+_log_writer_started = False
+
+
+def _write_log_rows(rows):
+    """Insert queued (sql, params, on_written) log rows, one executemany per table."""
+    by_sql = {}
+    for sql, params, _ in rows:
+        by_sql.setdefault(sql, []).append(params)
+    try:
+        conn = get_db()
+        try:
+            for sql, params in by_sql.items():
+                conn.executemany(sql, params)
+            conn.commit()
+        finally:
+            conn.close()
+    finally:
+        # Callbacks announce the change the row records, so they run even if the write failed
+        for _, _, on_written in rows:
+            if on_written is not None:
+                try:
+                    on_written()
+                except Exception:
+                    logging.getLogger(__name__).exception("Log row callback failed")
+
+
+def _log_writer():
+    while True:
+        batch = _next_batch(_LOG_QUEUE, _LOG_BATCH_MAX, _LOG_BATCH_WINDOW_SEC)
+        try:
+            _write_log_rows(batch)
+        except Exception:
+            logging.getLogger(__name__).exception("Failed to write %d log row(s)", len(batch))
+        finally:
+            for _ in batch:
+                _LOG_QUEUE.task_done()
+
+
+def flush_logs():
+    """Write any queued log rows now and wait for the batch in flight (used at shutdown)."""
+    rows = []
+    while True:
+        try:
+            rows.append(_LOG_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    try:
+        if rows:
+            _write_log_rows(rows)
+    finally:
+        for _ in rows:
+            _LOG_QUEUE.task_done()
+    _LOG_QUEUE.join()
+
+atexit.register(flush_logs)
+
+
+def _enqueue_log(sql, params, on_written=None):
+    global _log_writer_started
+    if not _log_writer_started:
+        with _LOG_WRITER_LOCK:
+            if not _log_writer_started:
+                threading.Thread(target=_log_writer, name="log-writer", daemon=True).start()
+                _log_writer_started = True
+    row = (sql, params + (strftime("%Y-%m-%d %H:%M:%S", gmtime()),), on_written)
+    try:
+        _LOG_QUEUE.put_nowait(row)
+    except queue.Full:
+        _write_log_rows([row])  # writer is falling behind — write inline rather than drop
+
+
+def log_assignment(sos_id, amb_id, action, distance_km=None, conn=None, on_written=None):
+    """
+    Record an assignment change. With `conn`, joins the caller's transaction;
+    otherwise queued, and `on_written` runs once the row is committed.
+    """
+    if conn is None:
+        _enqueue_log(_INSERT_ASSIGNMENT_SQL, (sos_id, amb_id, action, distance_km), on_written)
+        return
     conn.execute("INSERT INTO assignment_history (sos_id, ambulance_id, action, distance_km) VALUES (?,?,?,?)",
                  (sos_id, amb_id, action, distance_km))
-    conn.commit()
-    conn.close()
 
-def log_event(sos_id, amb_id, event_type, detail=""):
-    conn = get_db()
+def log_event(sos_id, amb_id, event_type, detail="", conn=None, on_written=None):
+    """
+    Append to the event log. With `conn`, joins the caller's transaction;
+    otherwise queued, and `on_written` runs once the row is committed.
+    """
+    if conn is None:
+        _enqueue_log(_INSERT_EVENT_SQL, (sos_id, amb_id, event_type, detail), on_written)
+        return
     conn.execute("INSERT INTO event_log (sos_id, ambulance_id, event_type, detail) VALUES (?,?,?,?)",
                  (sos_id, amb_id, event_type, detail))
-    conn.commit()
-    conn.close()
 
-def get_events(limit=50):
+_EVENT_FIELDS = frozenset(("id", "sos_id", "ambulance_id", "event_type", "detail", "created_at"))
+
+def get_events(limit=50, before=None, fields=None):
+    """
+    Newest events first. `before` is an event id cursor: only events older
+    than it are returned, so pages are index range scans rather than OFFSETs.
+    """
     conn = get_db()
-    rows = conn.execute("SELECT * FROM event_log ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    cols = _projection(fields, _EVENT_FIELDS)
+    if before is None:
+        rows = _fetch_dicts(conn, f"SELECT {cols} FROM event_log ORDER BY created_at DESC, id DESC LIMIT ?", (limit,))
+    else:
+        rows = _fetch_dicts(conn, f"""
+            SELECT {cols} FROM event_log
+            WHERE (created_at, id) < (SELECT created_at, id FROM event_log WHERE id=?)
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        """, (before, limit))
     conn.close()
-    return [dict(r) for r in rows]
+    return rows
 
 def get_events_for_sos(sos_id):
     conn = get_db()
-    rows = conn.execute("SELECT * FROM event_log WHERE sos_id=? ORDER BY created_at ASC", (sos_id,)).fetchall()
+    rows = _fetch_dicts(conn, "SELECT * FROM event_log WHERE sos_id=? ORDER BY created_at ASC", (sos_id,))
     conn.close()
-    return [dict(r) for r in rows]
+    return rows
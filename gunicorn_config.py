@@ -1,6 +1,10 @@
 import os
 
 bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+# Socket.IO rooms, the hospital/fleet caches and the reassignment scheduler
+# live in-process, so this must stay a single worker; gevent gives the
+# concurrency instead.
 workers = 1
 worker_class = "geventwebsocket.gunicorn.workers.GeventWebSocketWorker"
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 1000))
 timeout = 120
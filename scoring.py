@@ -9,8 +9,12 @@ Calculates a composite readiness score for each hospital based on:
   5. Predicted Availability (w=0.10) — Will beds still be free at ETA?
   6. Historical Success     (w=0.05) — Hospital's track record
 """
+import heapq
 from math import radians, cos, sin, asin, sqrt
+from operator import itemgetter
+import numpy as np
 from config import Config
+from scoring_fast import composite_scores, composite_scores_parallel
 
 # ──────────────────────────────────────────
 # Emergency type → required facilities & specialists mapping
@@ -54,23 +58,97 @@ EMERGENCY_REQUIREMENTS = {
 }
 
 
+def _name_bits(field, *more):
+    """
+    One bit per distinct lowercased name any emergency type lists under the
+    given fields, so a hospital's names reduce to an int and matching is popcount.
+    """
+    names = sorted({name.lower() for r in EMERGENCY_REQUIREMENTS.values()
+                    for f in (field, *more) for name in r[f]})
+    return {name: 1 << i for i, name in enumerate(names)}
+
+
+_FACILITY_BITS = _name_bits("facilities", "nice_to_have")
+_SPECIALIST_BITS = _name_bits("specialists")
+
+
+# Raw spelling → bit, per vocabulary, so each spelling is lowercased only once;
+# kept apart from the vocabularies so those stay exactly the requirement names
+_NAME_CACHE_MAX = 4096
+_FACILITY_SPELLINGS = {}
+_SPECIALIST_SPELLINGS = {}
+
+
+def _name_mask(names, bits, spellings):
+    """Bitmask of the names (case-insensitive) that appear in `bits`, memoized in `spellings`."""
+    mask = 0
+    for name in names:
+        bit = spellings.get(name)
+        if bit is None:
+            bit = bits.get(name.lower(), 0)
+            if len(spellings) < _NAME_CACHE_MAX:
+                spellings[name] = bit
+        mask |= bit
+    return mask
+
+
+# Per emergency type: (mask, count) for required facilities, nice-to-haves and specialists
+_TYPE_MASKS = {
+    etype: tuple(
+        (_name_mask(r[f], bits, spellings), len(r[f]))
+        for f, bits, spellings in (("facilities", _FACILITY_BITS, _FACILITY_SPELLINGS),
+                                   ("nice_to_have", _FACILITY_BITS, _FACILITY_SPELLINGS),
+                                   ("specialists", _SPECIALIST_BITS, _SPECIALIST_SPELLINGS))
+    )
+    for etype, r in EMERGENCY_REQUIREMENTS.items()
+}
+
+
+# Config is fixed once loaded, so the values read per hospital are bound here
+# (with the same fallbacks the scorers apply) instead of looked up each time
+_WEIGHTS = Config.WEIGHTS
+_WEIGHTS_ARR = np.array(_WEIGHTS, dtype=np.float64)
+_SPEED_KMH = float(Config.AVG_AMBULANCE_SPEED_KMH if Config.AVG_AMBULANCE_SPEED_KMH > 0 else 40)
+_RADIUS_KM = float(Config.SEARCH_RADIUS_KM if Config.SEARCH_RADIUS_KM > 0 else 15)
+
+# Below this many candidates, handing work to threads costs more than it saves
+_PARALLEL_MIN_HOSPITALS = 20_000
+
+
 def haversine(lat1, lon1, lat2, lon2):
     """
     Calculate the great-circle distance between two points
     on Earth using the Haversine formula. Returns distance in km.
     """
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    r = 6371  # Earth's radius in km
-    return c * r
+    lat1, lat2 = radians(lat1), radians(lat2)
+    s_lat = sin(0.5 * (lat2 - lat1))
+    s_lon = sin(0.5 * (radians(lon2) - radians(lon1)))
+    a = s_lat * s_lat + cos(lat1) * cos(lat2) * (s_lon * s_lon)
+    return 12742.0 * asin(sqrt(a))  # Earth's diameter in km
+
+
+def latlng_radians(records):
+    """
+    Build an (N, 2) float64 array of (lat, lng) in radians from hospital or
+    ambulance dicts, in the same order as `records`, for haversine_km_vec().
+    """
+    coords = np.array([(r["latitude"], r["longitude"]) for r in records], dtype=np.float64)
+    return np.radians(coords.reshape(-1, 2))
+
+
+def haversine_km_vec(lat_arr, lon_arr, lat0, lon0):
+    """
+    Vectorized Haversine from one point (degrees) to arrays of points (radians).
+    Returns a NumPy array of distances in km.
+    """
+    phi0, lam0 = radians(lat0), radians(lon0)
+    a = np.sin((lat_arr - phi0) / 2) ** 2 + cos(phi0) * np.cos(lat_arr) * np.sin((lon_arr - lam0) / 2) ** 2
+    return 2 * 6371 * np.arcsin(np.sqrt(a))
 
 
 def estimate_eta(distance_km, speed_kmh=None):
     """Estimate arrival time in minutes based on distance."""
-    speed = speed_kmh or Config.AVG_AMBULANCE_SPEED_KMH
+    speed = speed_kmh or _SPEED_KMH
     if speed <= 0:
         speed = 40
     return (distance_km / speed) * 60  # minutes
@@ -81,21 +159,21 @@ def _calc_facility_score(hospital, requirements):
     Calculate facility match score (0.0 – 1.0).
     Required facilities: weighted 80%, nice-to-have: weighted 20%.
     Handles missing data gracefully.
+
+    requirements: an entry of _TYPE_MASKS.
     """
-    required = requirements.get("facilities", [])
-    nice_to_have = requirements.get("nice_to_have", [])
-    hospital_facilities = hospital.get("facilities", [])
+    (required, n_required), (nice_to_have, n_nice), _ = requirements
 
-    if not required:
+    if not n_required:
         return 0.5  # neutral if no requirements
 
     # Case-insensitive matching
-    hospital_set = {f.lower() for f in hospital_facilities}
-    matched_required = sum(1 for f in required if f.lower() in hospital_set)
-    matched_nice = sum(1 for f in nice_to_have if f.lower() in hospital_set)
+    hospital_mask = _name_mask(hospital.get("facilities", []), _FACILITY_BITS, _FACILITY_SPELLINGS)
+    matched_required = (hospital_mask & required).bit_count()
+    matched_nice = (hospital_mask & nice_to_have).bit_count()
 
-    required_score = matched_required / len(required) if required else 0.5
-    nice_score = matched_nice / len(nice_to_have) if nice_to_have else 0.5
+    required_score = matched_required / n_required
+    nice_score = matched_nice / n_nice if n_nice else 0.5
 
     return 0.8 * required_score + 0.2 * nice_score
 
@@ -105,22 +183,33 @@ def _calc_distance_score(distance_km, max_radius_km=None):
     Calculate distance score (0.0 – 1.0).
     Closer = higher score. Uses inverse normalization.
     """
-    max_r = max_radius_km or Config.SEARCH_RADIUS_KM
+    max_r = max_radius_km or _RADIUS_KM
     if max_r <= 0:
         max_r = 15
-    score = 1.0 - min(distance_km / max_r, 1.0)
-    return max(score, 0.0)
+    # Clamp with comparisons rather than min()/max() calls
+    ratio = distance_km / max_r
+    score = 1.0 - (ratio if ratio < 1.0 else 1.0)
+    return score if score > 0.0 else 0.0
+
+
+_bed_fields = itemgetter("icu_beds", "available_icu_beds", "available_general_beds", "total_beds")
 
 
-def _calc_bed_score(hospital):
+def _calc_bed_score(hospital, load):
     """
     Calculate bed availability score (0.0 – 1.0).
     Combines ICU and general bed availability.
+
+    load: the hospital's load_percentage as a fraction (see _hospital_load).
     """
-    icu_total = hospital.get("icu_beds", 0)
-    icu_avail = hospital.get("available_icu_beds", 0)
-    gen_avail = hospital.get("available_general_beds", 0)
-    total_beds = hospital.get("total_beds", 1)
+    try:
+        # Hospitals loaded from the database always carry every column
+        icu_total, icu_avail, gen_avail, total_beds = _bed_fields(hospital)
+    except KeyError:
+        icu_total = hospital.get("icu_beds", 0)
+        icu_avail = hospital.get("available_icu_beds", 0)
+        gen_avail = hospital.get("available_general_beds", 0)
+        total_beds = hospital.get("total_beds", 1)
 
     if icu_total <= 0 and total_beds <= 0:
         return 0.5  # unknown → neutral
@@ -130,7 +219,6 @@ def _calc_bed_score(hospital):
     gen_score = (gen_avail / total_beds) if total_beds > 0 else 0.5
 
     # Also factor in overall load (lower load = better)
-    load = hospital.get("load_percentage", 50) / 100.0
     load_bonus = 1.0 - load
 
     return 0.50 * icu_score + 0.25 * gen_score + 0.25 * load_bonus
@@ -139,31 +227,36 @@ def _calc_bed_score(hospital):
 def _calc_specialist_score(hospital, requirements):
     """
     Calculate specialist availability score (0.0 – 1.0).
+
+    requirements: an entry of _TYPE_MASKS.
     """
-    needed_specialists = requirements.get("specialists", [])
-    on_duty = hospital.get("doctors_on_duty", [])
+    needed_specialists, n_needed = requirements[2]
 
-    if not needed_specialists:
+    if not n_needed:
         return 0.5
 
-    on_duty_lower = {d.lower() for d in on_duty}
-    matched = sum(1 for s in needed_specialists if s.lower() in on_duty_lower)
-    return matched / len(needed_specialists)
+    on_duty_mask = _name_mask(hospital.get("doctors_on_duty", []), _SPECIALIST_BITS, _SPECIALIST_SPELLINGS)
+    matched = (on_duty_mask & needed_specialists).bit_count()
+    return matched / n_needed
+
+
+def _hospital_load(hospital):
+    """Current load as a fraction (0.0 – 1.0); unknown counts as half full."""
+    return hospital.get("load_percentage", 50) / 100.0
 
 
-def _calc_prediction_score(hospital, eta_minutes):
+def _calc_prediction_score(current_bed_score, load, eta_minutes):
     """
     Predict bed availability at estimated arrival time.
     Uses a simple linear decay model based on current load trend.
     """
-    current_bed_score = _calc_bed_score(hospital)
-    load = hospital.get("load_percentage", 50) / 100.0
-
     # Assume fill rate: hospitals with higher load fill faster
     # Simple model: for every 15 min, lose (load * 0.05) of bed score
     eta_hours = eta_minutes / 60.0
     fill_rate = load * 0.05
-    predicted = max(0.0, current_bed_score - (fill_rate * eta_hours))
+    predicted = current_bed_score - (fill_rate * eta_hours)
+    if predicted < 0.0:
+        predicted = 0.0
 
     return predicted
 
@@ -182,35 +275,40 @@ def score_hospital(hospital, user_lat, user_lng, emergency_type):
     Returns:
         dict with individual scores, total score, distance, and ETA.
     """
-    requirements = EMERGENCY_REQUIREMENTS.get(
-        emergency_type, EMERGENCY_REQUIREMENTS["general"]
-    )
-
-    # Distance & ETA
     distance_km = haversine(user_lat, user_lng, hospital["latitude"], hospital["longitude"])
-    eta_minutes = estimate_eta(distance_km)
+    return score_hospital_at_distance(hospital, distance_km, emergency_type)
+
+
+def score_hospital_at_distance(hospital, distance_km, emergency_type):
+    """score_hospital() for a hospital whose distance from the patient is already known."""
+    requirements = _TYPE_MASKS.get(emergency_type, _TYPE_MASKS["general"])
+
+    # ETA — estimate_eta() inlined, with the speed guard already applied to _SPEED_KMH
+    eta_minutes = (distance_km / _SPEED_KMH) * 60
 
     # Individual scores
     facility = _calc_facility_score(hospital, requirements)
     distance = _calc_distance_score(distance_km)
-    bed = _calc_bed_score(hospital)
+    load = _hospital_load(hospital)
+    bed = _calc_bed_score(hospital, load)
     specialist = _calc_specialist_score(hospital, requirements)
-    prediction = _calc_prediction_score(hospital, eta_minutes)
+    prediction = _calc_prediction_score(bed, load, eta_minutes)
     history = _calc_history_score(hospital)
 
     # Weighted composite score
+    w_facility, w_distance, w_beds, w_specialist, w_prediction, w_history = _WEIGHTS
     total = (
-        Config.WEIGHT_FACILITY * facility
-        + Config.WEIGHT_DISTANCE * distance
-        + Config.WEIGHT_BEDS * bed
-        + Config.WEIGHT_SPECIALIST * specialist
-        + Config.WEIGHT_PREDICTION * prediction
-        + Config.WEIGHT_HISTORY * history
+        w_facility * facility
+        + w_distance * distance
+        + w_beds * bed
+        + w_specialist * specialist
+        + w_prediction * prediction
+        + w_history * history
     )
 
     # Specialization bonus: if hospital explicitly lists this emergency type
-    specializations = hospital.get("specializations", [])
-    if emergency_type.lower() in [s.lower() for s in specializations]:
+    etype = emergency_type.lower()
+    if any(s.lower() == etype for s in hospital.get("specializations", [])):
         total = min(total * 1.10, 1.0)  # 10% bonus, capped at 1.0
 
     return {
@@ -229,40 +327,207 @@ def score_hospital(hospital, user_lat, user_lng, emergency_type):
     }
 
 
-def rank_hospitals(hospitals, user_lat, user_lng, emergency_type, max_radius_km=None):
+def build_hospital_table(hospitals):
     """
-    Score and rank all hospitals for a given emergency.
+    Precompute per-hospital arrays for vectorized ranking, in the same order
+    as `hospitals`: coordinates, the request-independent score components, and
+    the facility/specialist scores and specialization flag per emergency type.
 
-    Returns:
-        Sorted list of scored hospitals (best first), filtered by radius.
+    Rebuild it whenever hospital data changes.
     """
-    radius = max_radius_km or Config.SEARCH_RADIUS_KM
+    n = len(hospitals)
+    facility_masks = np.fromiter(
+        (_name_mask(h.get("facilities", []), _FACILITY_BITS, _FACILITY_SPELLINGS) for h in hospitals),
+        dtype=np.uint64, count=n)
+    doctor_masks = np.fromiter(
+        (_name_mask(h.get("doctors_on_duty", []), _SPECIALIST_BITS, _SPECIALIST_SPELLINGS) for h in hospitals),
+        dtype=np.uint64, count=n)
+    specializations = [{s.lower() for s in h.get("specializations", [])} for h in hospitals]
+    by_type = {}
+    for etype, (required, nice, needed) in _TYPE_MASKS.items():
+        by_type[etype] = {
+            "facility": _facility_scores_vec(facility_masks, required, nice),
+            "specialist": _match_ratio_vec(doctor_masks, needed),
+            "bonus": np.fromiter((etype in specs for specs in specializations), dtype=bool, count=n),
+        }
+    cols = _hospital_columns(hospitals)
+    load = cols["load_percentage"] / 100.0
+    return {
+        "coords": np.radians(np.stack((cols["latitude"], cols["longitude"]), axis=-1)),
+        "bed": _bed_scores_vec(cols, load),
+        "load": load,
+        "history": cols["historical_success_rate"],
+        "by_type": by_type,
+    }
+
+
+def _match_ratio_vec(masks, wanted):
+    """Share of the `wanted` (mask, count) names set in each mask; 0.5 when nothing is wanted."""
+    mask, count = wanted
+    if not count:
+        return np.full(len(masks), 0.5)
+    return np.bitwise_count(masks & np.uint64(mask)).astype(np.float64) / count
+
+
+def _facility_scores_vec(masks, required, nice):
+    """_calc_facility_score() over facility bitmasks, same operation order."""
+    if not required[1]:
+        return np.full(len(masks), 0.5)
+    return 0.8 * _match_ratio_vec(masks, required) + 0.2 * _match_ratio_vec(masks, nice)
+
+
+# Numeric hospital fields and the defaults the scalar scorers fall back to
+_HOSPITAL_NUMERIC = (
+    ("latitude", None),
+    ("longitude", None),
+    ("icu_beds", 0),
+    ("available_icu_beds", 0),
+    ("available_general_beds", 0),
+    ("total_beds", 1),
+    ("load_percentage", 50),
+    ("historical_success_rate", 0.5),
+)
+
+
+def _hospital_columns(hospitals):
+    """One contiguous float64 array per numeric field of `hospitals` (column layout)."""
+    n = len(hospitals)
+    cols = {}
+    for field, default in _HOSPITAL_NUMERIC:
+        if default is None:
+            values = (h[field] for h in hospitals)
+        else:
+            values = (h.get(field, default) for h in hospitals)
+        cols[field] = np.fromiter(values, dtype=np.float64, count=n)
+    return cols
+
+
+def _bed_scores_vec(cols, load):
+    """_calc_bed_score() over _hospital_columns() arrays, same operation order."""
+    icu_total, total_beds = cols["icu_beds"], cols["total_beds"]
+    icu_score = np.full_like(icu_total, 0.5)
+    np.divide(cols["available_icu_beds"], icu_total, out=icu_score, where=icu_total > 0)
+    gen_score = np.full_like(total_beds, 0.5)
+    np.divide(cols["available_general_beds"], total_beds, out=gen_score, where=total_beds > 0)
+    score = 0.50 * icu_score + 0.25 * gen_score + 0.25 * (1.0 - load)
+    score[(icu_total <= 0) & (total_beds <= 0)] = 0.5  # unknown → neutral
+    return score
+
+
+def _within_radius(coords, user_lat, user_lng, radius):
+    """
+    (indices, km) of the points in `coords` (radians) within `radius` km of
+    the user, plus a margin because the final cut is on the rounded distance.
+    """
+    limit = radius + 0.005
+    # A great-circle distance is never shorter than the north-south gap, so a
+    # latitude band drops far points before any trig (1e-9 rad of slack for rounding)
+    band = limit / 6371 + 1e-9
+    near = np.flatnonzero(np.abs(coords[:, 0] - radians(user_lat)) <= band)
+    dist = haversine_km_vec(coords[near, 0], coords[near, 1], user_lat, user_lng)
+    inside = dist <= limit
+    return near[inside], dist[inside]
+
+
+def _rank_vectorized(table, hospitals, user_lat, user_lng, emergency_type, radius):
+    """score_hospital() for every hospital at once, using a build_hospital_table() table."""
+    keep, dist = _within_radius(table["coords"], user_lat, user_lng, radius)
+    per_type = table["by_type"][emergency_type]
+    facility, specialist = per_type["facility"][keep], per_type["specialist"][keep]
+    bed, load, history = table["bed"][keep], table["load"][keep], table["history"][keep]
+
+    # composite_scores() repeats the scalar helpers' operations in the same order
+    kernel = composite_scores_parallel if len(keep) >= _PARALLEL_MIN_HOSPITALS else composite_scores
+    eta, distance, prediction, total = kernel(
+        dist, facility, specialist, bed, load, history, per_type["bonus"][keep],
+        _WEIGHTS_ARR, _SPEED_KMH, _RADIUS_KM,
+    )
+
     scored = []
+    for k, i in enumerate(keep.tolist()):
+        distance_km = round(float(dist[k]), 2)
+        if distance_km > radius:
+            continue
+        scored.append({
+            "hospital": hospitals[i],
+            "scores": {
+                "facility": round(float(facility[k]), 3),
+                "distance": round(float(distance[k]), 3),
+                "bed": round(float(bed[k]), 3),
+                "specialist": round(float(specialist[k]), 3),
+                "prediction": round(float(prediction[k]), 3),
+                "history": round(float(history[k]), 3),
+            },
+            "total_score": round(float(total[k]), 4),
+            "distance_km": distance_km,
+            "eta_minutes": round(float(eta[k]), 1),
+        })
+    return scored
 
-    for hospital in hospitals:
-        result = score_hospital(hospital, user_lat, user_lng, emergency_type)
-        if result["distance_km"] <= radius:
-            scored.append(result)
 
-    # Sort by total score (descending)
-    scored.sort(key=lambda x: x["total_score"], reverse=True)
+def _score_in_range(hospitals, user_lat, user_lng, emergency_type, radius, table):
+    """Unsorted score_hospital() results for every hospital within `radius` km."""
+    if table is not None and emergency_type in table["by_type"]:
+        return _rank_vectorized(table, hospitals, user_lat, user_lng, emergency_type, radius)
+
+    # Distances in one vectorized pass; only hospitals near the radius are scored, reusing them
+    keep, dist = _within_radius(latlng_radians(hospitals), user_lat, user_lng, radius)
+    scored = []
+    for i, d in zip(keep.tolist(), dist.tolist()):
+        # Same cut as on the result's rounded distance_km, made before building the result
+        if round(d, 2) <= radius:
+            scored.append(score_hospital_at_distance(hospitals[i], d, emergency_type))
     return scored
 
 
-def get_best_hospitals(hospitals, user_lat, user_lng, emergency_type, max_radius_km=None):
+_total_score = itemgetter("total_score")
+
+
+def _best_first(scored, top_k):
+    """Sort by total score (descending); with top_k, only select that many (ties keep input order)."""
+    if top_k is None:
+        scored.sort(key=_total_score, reverse=True)
+        return scored
+    return heapq.nlargest(top_k, scored, key=_total_score)
+
+
+def rank_hospitals(hospitals, user_lat, user_lng, emergency_type, max_radius_km=None, table=None, top_k=None):
+    """
+    Score and rank all hospitals for a given emergency.
+
+    table: optional build_hospital_table(hospitals) result — when given,
+    every hospital is scored in one vectorized pass. Without it, distances are
+    still computed in one pass and only hospitals in range are scored.
+    top_k: return only the best top_k, selected without sorting the rest.
+
+    Returns:
+        Sorted list of scored hospitals (best first), filtered by radius.
+    """
+    radius = max_radius_km or Config.SEARCH_RADIUS_KM
+    scored = _score_in_range(hospitals, user_lat, user_lng, emergency_type, radius, table)
+    return _best_first(scored, top_k)
+
+
+def get_best_hospitals(hospitals, user_lat, user_lng, emergency_type, max_radius_km=None, table=None, top_k=None):
     """
     Get the best and backup hospital recommendation.
 
+    top_k: limit "all_scored" to the best top_k; "total_candidates" still
+    counts every hospital in range.
+
     Returns:
         dict with "best", "backup" (if available), and "all_scored" list.
     """
-    ranked = rank_hospitals(hospitals, user_lat, user_lng, emergency_type, max_radius_km)
+    radius = max_radius_km or Config.SEARCH_RADIUS_KM
+    scored = _score_in_range(hospitals, user_lat, user_lng, emergency_type, radius, table)
+    total_candidates = len(scored)
+    ranked = _best_first(scored, top_k)
 
     result = {
         "best": ranked[0] if len(ranked) > 0 else None,
         "backup": ranked[1] if len(ranked) > 1 else None,
         "all_scored": ranked,
-        "total_candidates": len(ranked),
+        "total_candidates": total_candidates,
         "emergency_type": emergency_type,
         "requirements": EMERGENCY_REQUIREMENTS.get(
             emergency_type, EMERGENCY_REQUIREMENTS["general"]
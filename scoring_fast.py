@@ -0,0 +1,67 @@
+"""
+Numba-compiled geometry kernels for the dispatch hot paths.
+
+Signatures are given explicitly so the kernels compile (or load from the
+on-disk cache) at import time, keeping JIT cost off the request path.
+"""
+from math import asin, cos, radians, sin, sqrt
+import numpy as np
+from numba import njit, prange
+
+
+@njit("f8(f8, f8, f8, f8)", fastmath=True, cache=True)
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between two points given in degrees."""
+    lat1, lon1, lat2, lon2 = radians(lat1), radians(lon1), radians(lat2), radians(lon2)
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 2 * asin(sqrt(a)) * 6371
+
+
+@njit(cache=True)
+def _composite_one(i, out, dist, facility, specialist, bed, load, history, bonus, weights, speed, max_r):
+    """Fill column i of composite_scores()'s output; operations mirror scoring.score_hospital()."""
+    eta = (dist[i] / speed) * 60
+    distance = max(1.0 - min(dist[i] / max_r, 1.0), 0.0)
+    prediction = max(0.0, bed[i] - ((load[i] * 0.05) * (eta / 60.0)))
+    total = (
+        weights[0] * facility[i]
+        + weights[1] * distance
+        + weights[2] * bed[i]
+        + weights[3] * specialist[i]
+        + weights[4] * prediction
+        + weights[5] * history[i]
+    )
+    if bonus[i]:
+        total = min(total * 1.10, 1.0)
+    out[0, i] = eta
+    out[1, i] = distance
+    out[2, i] = prediction
+    out[3, i] = total
+
+
+_COMPOSITE_SIG = "f8[:, :](f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], b1[:], f8[:], f8, f8)"
+
+
+@njit(_COMPOSITE_SIG, cache=True)
+def composite_scores(dist, facility, specialist, bed, load, history, bonus, weights, speed, max_r):
+    """
+    ETA, distance score, predicted-bed score and weighted total for each
+    hospital in one fused pass, returned as rows of a (4, N) array.
+
+    fastmath is left off so the results match the scalar path exactly.
+    """
+    n = dist.shape[0]
+    out = np.empty((4, n))
+    for i in range(n):
+        _composite_one(i, out, dist, facility, specialist, bed, load, history, bonus, weights, speed, max_r)
+    return out
+
+
+@njit(_COMPOSITE_SIG, cache=True, parallel=True)
+def composite_scores_parallel(dist, facility, specialist, bed, load, history, bonus, weights, speed, max_r):
+    """composite_scores() with hospitals split across threads; only worth it for large N."""
+    n = dist.shape[0]
+    out = np.empty((4, n))
+    for i in prange(n):
+        _composite_one(i, out, dist, facility, specialist, bed, load, history, bonus, weights, speed, max_r)
+    return out
@@ -86,7 +86,7 @@ function showAdminFeedback(msg, type) {
 
 // ─── Socket.IO ───────────────────────────────────
 function initSocket() {
-    socket = io();
+    socket = io({ query: { role: 'admin' } });
     socket.on('connect', () => {
         document.getElementById('connection-badge').textContent = '● Live';
         document.getElementById('connection-badge').className = 'driver-status-badge available';
@@ -134,7 +134,8 @@ function onNewSOS(data) {
     refreshAfterDelay();
 }
 
-function onLiveLocationUpdate(data) {
+function onLiveLocationUpdate(frame) {
+    // frame is [ambulance_id, latitude, longitude, epoch_ms]
     // Could update driver markers on a map — for now refresh drivers tab if active
     // We'll update the driver status indicator
 }
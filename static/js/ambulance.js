@@ -5,7 +5,8 @@
  * SOS_ID & HOSPITAL_ID injected from template.
  */
 
-const socket = io();
+// Joining via the query string re-subscribes automatically on reconnect
+const socket = io({ query: { sos_id: SOS_ID } });
 let ambulanceId = null;
 let driverData = null;
 let pollInterval = null;
@@ -16,7 +17,6 @@ const STEPS = ['requested', 'assigned', 'accepted', 'enroute', 'arrived', 'compl
 // ─── Init ────────────────────────────────────────
 document.addEventListener('DOMContentLoaded', () => {
     socket.on('connect', () => console.log('Socket connected'));
-    socket.emit('join_sos', { sos_id: SOS_ID });
 
     // Listen for real-time events
     socket.on('driver_assignment', onDriverAssigned);
@@ -157,9 +157,11 @@ function onStatusChanged(data) {
     loadEvents();
 }
 
-function onLocationUpdate(data) {
-    if (data.ambulance_id !== ambulanceId) return;
-    updateDriverLocation(data.latitude, data.longitude);
+function onLocationUpdate(frame) {
+    // [ambulance_id, latitude, longitude, epoch_ms]
+    const [ambId, lat, lng] = frame;
+    if (ambId !== ambulanceId) return;
+    updateDriverLocation(lat, lng);
 }
 
 function onTripCompleted(data) {
@@ -287,10 +289,12 @@ function showHospitalCard(h) {
 }
 
 // ─── Location Polling ────────────────────────────
+// Fallback only: while the socket is connected, location_update events for
+// this SOS's room already keep the map current.
 function startLocationPoll() {
     if (pollInterval) return;
     pollInterval = setInterval(async () => {
-        if (!ambulanceId) return;
+        if (!ambulanceId || socket.connected) return;
         try {
             const res = await fetch(`/api/ambulance/${ambulanceId}/location`);
             const data = await res.json();
@@ -128,7 +128,7 @@ function initDashboard() {
         `${currentAmbulance.vehicle_number} · ${currentAmbulance.driver_phone || ''}`;
 
     // Connect socket
-    const socket = io();
+    const socket = io({ query: { ambulance_id: currentAmbulance.id } });
     window._socket = socket;
 
     socket.on('connect', () => console.log('Driver socket connected'));
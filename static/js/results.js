@@ -109,7 +109,14 @@ function haversine(lat1, lon1, lat2, lon2) {
     return R * 2 * Math.asin(Math.sqrt(a));
 }
 
+// /api/sos sends all_hospitals as {columns, rows}; expand to one object per hospital
+function expandHospitalRows(all) {
+    if (!all || !all.columns) return all;
+    return all.rows.map(row => Object.fromEntries(all.columns.map((c, i) => [c, row[i]])));
+}
+
 function renderResults(data) {
+    data.all_hospitals = expandHospitalRows(data.all_hospitals);
     // Best Hospital Card
     if (data.best_hospital) {
         const b = data.best_hospital;